@@ -134,8 +134,7 @@ def get_pymol_screenshot() -> str:
         "ray 600,600",
         "png screenshot.png, dpi=100",
     ]
-    for command in screenshot_commands:
-        st.session_state.ps.server.do(command)
+    st.session_state.ps.run_commands(screenshot_commands)
 
     base64_image = encode_image("screenshot.png")
     return base64_image
@@ -189,12 +188,9 @@ def run_cmd(commands: List[str]) -> str:
         return "PyMOL session is not initialized. Please initialize it first."
 
     results = []
-    for command in commands:
-        try:
-            out = st.session_state.ps.server.do(command)
-        except Exception as e:  # noqa: BLE001
-            out = f"[ERROR] {e}"
-        results.append({"command": command, "result": str(out)})
+    for entry in st.session_state.ps.run_commands(commands):
+        out = entry["result"] if entry["ok"] else f"[ERROR] {entry['error']}"
+        results.append({"command": entry["command"], "result": str(out)})
 
     # Return a concise, readable summary for the LLM
     summary_lines = ["Executed PyMOL commands:"]
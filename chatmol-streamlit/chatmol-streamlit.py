@@ -1,3 +1,4 @@
+import uuid
 import streamlit as st
 import chatmol as cm
 
@@ -20,17 +21,27 @@ introduction_of_models = {
     'claude-3-opus-20240229': "Strong performance on highly complex tasks, such as math and coding.\n - Task automation across APIs and databases, and powerful coding tasks\n - R&D, brainstorming and hypothesis generation, and drug discovery\n - Strategy, advanced analysis of charts and graphs, financials and market trends, and forecasting"
 }
 
+# Each browser session gets its own conversation history and stash
+if "session_id" not in st.session_state:
+    st.session_state["session_id"] = uuid.uuid4().hex
+st.session_state["cm"] = cm.get_session(st.session_state["session_id"])
+
 if "ps" not in st.session_state:
-    st.session_state["cm"] = cm
     if st.button("Start PyMOL"):
-        st.session_state["ps"] = cm.start_pymol_gui()
+        st.session_state["ps"] = cm.start_pymol_gui(st.session_state["cm"])
+else:
+    st.session_state["ps"].cm = st.session_state["cm"]
+
+# Page loads only read the probe results cached on the shared client; the
+# providers are called only when the check button below is pressed
+api_status = st.session_state["cm"].health.status()
 
 if "available_llms" not in st.session_state:
     st.session_state["available_llms"] = []
-    if st.session_state["cm"].defaul_client.client is not None:
+    if st.session_state["cm"].client is not None:
         st.session_state["available_llms"].extend(openai_llms)
     st.session_state["available_llms"].extend(chatmol_llms)
-    if st.session_state["cm"].defaul_client.client_anthropic is not None:
+    if st.session_state["cm"].client_anthropic is not None:
         st.session_state["available_llms"].extend(claude_llms)
 
 if "llm" not in st.session_state:
@@ -41,14 +52,17 @@ st.session_state["llm"] = st.sidebar.selectbox("Select LLM", st.session_state["a
 st.sidebar.write(introduction_of_models.get(st.session_state["llm"], "No introduction available"))
 
 if st.session_state["llm"] in openai_llms+claude_llms:
+    provider = "openai" if st.session_state["llm"] in openai_llms else "anthropic"
     if st.sidebar.button("check api availability"):
         with st.spinner("Checking..."):
-            results = st.session_state["cm"].defaul_client.test_api_access()
-        for k, v in results.items():
-            if v:
-                st.sidebar.info(v)
-            else:
-                st.sidebar.info(f"{k.split('_')[0]} is available")
+            api_status = st.session_state["cm"].health.check([provider], force=True)
+    status = api_status.get(provider)
+    if status is None:
+        st.sidebar.info(f"{provider} has not been checked yet")
+    elif status["available"]:
+        st.sidebar.info(f"{provider} is available ({status['latency']:.2f}s)")
+    else:
+        st.sidebar.info(f"{provider} is unavailable: {status['error_class']}: {status['error']}")
 
 if "messages" not in st.session_state:
     st.session_state['messages'] = []
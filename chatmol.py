@@ -1,21 +1,97 @@
 import os
 import requests
 import threading
+import hashlib
+import gzip
 import json
+import queue
+import time
 import http.server
+import urllib.parse
 
-from typing import Dict, List, Optional, Literal, Union
+from requests.adapters import HTTPAdapter
+
+from http import HTTPStatus
+
+from typing import Callable, Dict, Iterator, List, Optional, Literal, Tuple, Union
 from datetime import datetime
 from pymol import cmd
 
-class PyMOLCommandHandler(http.server.BaseHTTPRequestHandler):
+class PyMOLCommandQueue:
+    """Bounded queue of command batches, executed one batch at a time.
+
+    HTTP request threads submit batches and wait for their results; the
+    queue is drained on PyMOL's main (Qt) thread when one is available, or
+    on a single dedicated thread otherwise, so cmd.do is never called
+    concurrently from the request threads.
+    """
+
+    def __init__(self, maxsize: int = 32, drain_interval_ms: int = 20):
+        self.jobs = queue.Queue(maxsize=maxsize)
+        self.drain_interval_ms = drain_interval_ms
+        self._timer = None
+        self._thread = None
+
+    def submit(self, commands: List[str], block: bool = False) -> Dict:
+        """Queue a batch of commands; raises queue.Full when saturated."""
+        job = {"commands": commands, "results": None, "done": threading.Event()}
+        self.jobs.put(job, block=block)
+        return job
+
+    def drain(self) -> None:
+        """Execute every queued batch. Must run on the executing thread."""
+        while True:
+            try:
+                job = self.jobs.get_nowait()
+            except queue.Empty:
+                return
+            self.run_job(job)
+
+    def run_job(self, job: Dict) -> None:
+        job["results"] = [self.run_command(command) for command in job["commands"]]
+        job["done"].set()
+
+    @staticmethod
+    def run_command(command: str) -> Dict[str, Union[str, bool, float]]:
+        start = time.perf_counter()
+        try:
+            cmd.do(command)
+            ok, error = True, ""
+        except Exception as e:
+            ok, error = False, str(e)
+        return {
+            "command": command,
+            "ok": ok,
+            "error": error,
+            "elapsed_ms": round((time.perf_counter() - start) * 1000, 3),
+        }
 
-    def __init__(self):
+    def start(self) -> None:
+        """Start draining on the Qt main thread, falling back to a worker thread."""
+        if self._timer is not None or self._thread is not None:
+            return
+        if threading.current_thread() is threading.main_thread():
+            try:
+                from pymol.Qt import QtCore, QtWidgets
+
+                if QtWidgets.QApplication.instance() is not None:
+                    self._timer = QtCore.QTimer()
+                    self._timer.timeout.connect(self.drain)
+                    self._timer.start(self.drain_interval_ms)
+                    return
+            except ImportError:
+                pass
+        self._thread = threading.Thread(target=self._drain_forever, daemon=True)
+        self._thread.start()
 
-        from http import HTTPStatus
-        import urllib.parse
+    def _drain_forever(self) -> None:
+        while True:
+            self.run_job(self.jobs.get())
 
-        super().__init__()
+
+class PyMOLCommandHandler(http.server.BaseHTTPRequestHandler):
+    command_queue: PyMOLCommandQueue = None
+    result_timeout = 120
 
     def _send_cors_headers(self):
         """Sets headers required for CORS"""
@@ -23,6 +99,29 @@ class PyMOLCommandHandler(http.server.BaseHTTPRequestHandler):
         self.send_header("Access-Control-Allow-Methods", "GET,POST,OPTIONS")
         self.send_header("Access-Control-Allow-Headers", "x-api-key,Content-Type")
 
+    def _send_body(self, status, body: bytes, content_type: str = "text/plain"):
+        self.send_response(status)
+        self._send_cors_headers()
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _run_commands(self, commands: List[str]) -> Optional[List[Dict]]:
+        """Queue commands for the main thread and wait for their results.
+
+        Sends the error response itself and returns None on failure.
+        """
+        try:
+            job = self.command_queue.submit(commands)
+        except queue.Full:
+            self._send_body(HTTPStatus.TOO_MANY_REQUESTS, b"Command queue is full, retry later")
+            return None
+        if not job["done"].wait(self.result_timeout):
+            self._send_body(HTTPStatus.GATEWAY_TIMEOUT, b"Timed out waiting for PyMOL")
+            return None
+        return job["results"]
+
     def do_OPTIONS(self):
         """Respond to a OPTIONS request."""
         self.send_response(HTTPStatus.NO_CONTENT)
@@ -30,25 +129,41 @@ class PyMOLCommandHandler(http.server.BaseHTTPRequestHandler):
         self.end_headers()
 
     def do_POST(self):
-        if self.path != "/send_message":
+        if self.path not in ("/send_message", "/batch"):
             self.send_response(HTTPStatus.NOT_FOUND)
             self.end_headers()
             return
 
         content_length = int(self.headers["Content-Length"])
         post_data = self.rfile.read(content_length)
-        post_data = urllib.parse.unquote(post_data.decode())
 
-        try:
-            cmd.do(post_data)
-            self.send_response(HTTPStatus.OK)
-            self._send_cors_headers()
-            self.end_headers()
-            self.wfile.write(b"Command executed")
-        except Exception as e:
-            self.send_response(HTTPStatus.INTERNAL_SERVER_ERROR)
-            self.end_headers()
-            self.wfile.write(str(e).encode())
+        if self.path == "/batch":
+            try:
+                commands = json.loads(post_data.decode())
+                if isinstance(commands, dict):
+                    commands = commands.get("commands")
+                if not isinstance(commands, list) or not all(
+                    isinstance(c, str) for c in commands
+                ):
+                    raise ValueError("expected a JSON array of command strings")
+            except ValueError as e:
+                self._send_body(HTTPStatus.BAD_REQUEST, str(e).encode())
+                return
+            results = self._run_commands(commands)
+            if results is None:
+                return
+            body = {"ok": all(r["ok"] for r in results), "results": results}
+            self._send_body(HTTPStatus.OK, json.dumps(body).encode(), "application/json")
+            return
+
+        post_data = urllib.parse.unquote(post_data.decode())
+        results = self._run_commands([post_data])
+        if results is None:
+            return
+        if results[0]["ok"]:
+            self._send_body(HTTPStatus.OK, b"Command executed")
+        else:
+            self._send_body(HTTPStatus.INTERNAL_SERVER_ERROR, results[0]["error"].encode())
 
     def do_GET(self):
         if self.path == "/":
@@ -61,6 +176,526 @@ class PyMOLCommandHandler(http.server.BaseHTTPRequestHandler):
         self.send_response(HTTPStatus.NOT_FOUND)
         self.end_headers()
 
+
+class PyMOLCommandStream:
+    """Incrementally extract PyMOL commands from ``` fenced blocks.
+
+    Text is fed in arbitrary chunks (e.g. streamed tokens). Every time a
+    command line inside a fence is complete, it is passed to ``on_command``.
+    Feeding a whole response and calling ``close`` yields the same commands
+    as splitting the finished response on ```.
+    """
+
+    FENCE = "```"
+
+    def __init__(self, on_command: Callable[[str], None]):
+        self.on_command = on_command
+        self._buffer = ""
+        self._in_block = False
+
+    @staticmethod
+    def clean_command(line: str) -> Optional[str]:
+        """Return the executable part of a fenced line, or None to skip it."""
+        command = line.strip()
+        if (
+            not command
+            or command.startswith("#")
+            or command == "python"
+            or command == "pymol"
+        ):
+            return None
+        # Handle inline comments
+        if "#" in command:
+            command = command[: command.index("#")].strip()
+        return command or None
+
+    def feed(self, text: str) -> None:
+        """Consume a chunk of text, emitting any completed command lines."""
+        self._buffer += text
+        while True:
+            fence = self._buffer.find(self.FENCE)
+            newline = self._buffer.find("\n")
+            if fence == -1 and newline == -1:
+                # Wait for more text: the line (or a fence) is not complete yet
+                return
+            if fence != -1 and (newline == -1 or fence < newline):
+                segment = self._buffer[:fence]
+                self._buffer = self._buffer[fence + len(self.FENCE):]
+                self._emit(segment)
+                self._in_block = not self._in_block
+            else:
+                segment = self._buffer[:newline]
+                self._buffer = self._buffer[newline + 1:]
+                self._emit(segment)
+
+    def close(self) -> None:
+        """Flush the trailing line, e.g. an unterminated block at end of text."""
+        segment, self._buffer = self._buffer, ""
+        self._emit(segment)
+        self._in_block = False
+
+    def _emit(self, segment: str) -> None:
+        if not self._in_block:
+            return
+        command = self.clean_command(segment)
+        if command:
+            self.on_command(command)
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token for English and code)."""
+    return len(text) // 4 + 1
+
+
+class ConversationWindow:
+    """Keep the request history within a per-model token budget.
+
+    When the history grows past the budget, the oldest turns are folded
+    into a short summary (the user's requests and the commands that were
+    generated). The system prompt and the last ``keep_exchanges``
+    user/assistant exchanges are always sent verbatim.
+    """
+
+    DEFAULT_BUDGET = 8000
+    MODEL_BUDGETS = {
+        "gpt-4o": 16000,
+        "gpt-4o-mini": 16000,
+        "claude-3-5-sonnet-20241022": 16000,
+        "claude-3-5-haiku-20241022": 16000,
+        "claude-3-opus-20240229": 16000,
+        "claude-3-5-sonnet-20240620": 16000,
+        "deepseek-chat": 12000,
+    }
+
+    def __init__(
+        self,
+        token_estimator: Optional[Callable[[str], int]] = None,
+        budgets: Optional[Dict[str, int]] = None,
+        keep_exchanges: int = 3,
+        max_summary_chars: int = 2000,
+    ):
+        self.token_estimator = token_estimator or estimate_tokens
+        self.budgets = dict(self.MODEL_BUDGETS)
+        self.budgets.update(budgets or {})
+        self.keep_exchanges = keep_exchanges
+        self.max_summary_chars = max_summary_chars
+
+    def budget_for(self, model: str) -> int:
+        return self.budgets.get(model, self.DEFAULT_BUDGET)
+
+    def count(self, messages: List[Dict[str, str]], summary: str = "") -> int:
+        total = self.token_estimator(summary) if summary else 0
+        for msg in messages:
+            total += self.token_estimator(msg["content"]) + 4  # per-message overhead
+        return total
+
+    def compact(
+        self, history: List[Dict[str, str]], summary: str, model: str
+    ) -> Tuple[List[Dict[str, str]], str]:
+        """Return (history, summary) with old turns folded into the summary.
+
+        ``history[0]`` is the system message and is always kept.
+        """
+        if self.count(history, summary) <= self.budget_for(model):
+            return history, summary
+
+        # Find the start of the last N exchanges (each begins with a user turn)
+        user_turns = [i for i, msg in enumerate(history) if i and msg["role"] == "user"]
+        if len(user_turns) <= self.keep_exchanges:
+            return history, summary
+        cut = user_turns[-self.keep_exchanges] if self.keep_exchanges else len(history)
+
+        lines = [summary] if summary else []
+        for msg in history[1:cut]:
+            lines.append(self.summarize_message(msg))
+        summary = "\n".join(line for line in lines if line)
+        if len(summary) > self.max_summary_chars:
+            # Keep the most recent part of the summary
+            summary = summary[-self.max_summary_chars:].split("\n", 1)[-1]
+        return [history[0]] + history[cut:], summary
+
+    @staticmethod
+    def summarize_message(msg: Dict[str, str]) -> str:
+        content = msg["content"].strip()
+        if msg["role"] == "user":
+            return "- User asked: " + " ".join(content.split())[:200]
+        if msg["role"] == "assistant":
+            commands = []
+            parser = PyMOLCommandStream(commands.append)
+            parser.feed(content)
+            parser.close()
+            if commands:
+                return "  Commands: " + "; ".join(commands)[:300]
+            return "  Assistant: " + " ".join(content.split())[:150]
+        return ""
+
+
+class ResponseCache:
+    """On-disk cache of assistant responses for deterministic requests.
+
+    Each entry is a JSON file named by the SHA-256 of the request key.
+    File mtimes track recency for LRU eviction once ``max_entries`` or
+    ``max_bytes`` is exceeded, and entries older than ``ttl`` seconds are
+    treated as misses.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str,
+        max_entries: int = 512,
+        max_bytes: int = 16 * 1024 * 1024,
+        ttl: float = 7 * 24 * 3600,
+    ):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @classmethod
+    def from_config(cls, cache_dir: str, settings: Dict) -> "ResponseCache":
+        """Build from the "response_cache" config section, skipping unknown keys."""
+        known = ("max_entries", "max_bytes", "ttl")
+        if not isinstance(settings, dict):
+            print(f"Warning: ignoring response_cache config {settings!r} (not a mapping)")
+            settings = {}
+        for name in sorted(set(settings) - set(known)):
+            print(f"Warning: ignoring unknown response_cache setting {name!r}")
+        return cls(cache_dir, **{k: v for k, v in settings.items() if k in known})
+
+    @staticmethod
+    def make_key(provider: str, model: str, messages: List[Dict[str, str]]) -> str:
+        """Hash provider, model and whitespace-normalized messages (incl. system)."""
+        normalized = [
+            {"role": msg["role"], "content": " ".join(msg["content"].split())}
+            for msg in messages
+        ]
+        blob = json.dumps(
+            {"provider": provider, "model": model, "messages": normalized},
+            sort_keys=True,
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key + ".json")
+
+    def get(self, key: str) -> Optional[str]:
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        if time.time() - entry.get("created", 0) > self.ttl:
+            self._remove(path)
+            self.misses += 1
+            return None
+        os.utime(path)  # mark as recently used
+        self.hits += 1
+        return entry["response"]
+
+    def put(self, key: str, response: str) -> None:
+        try:
+            with open(self._path(key), "w", encoding="utf-8") as f:
+                json.dump({"created": time.time(), "response": response}, f)
+        except OSError as e:
+            print(f"Warning: could not write response cache: {e}")
+            return
+        self.evict()
+
+    def _entries(self) -> List[os.DirEntry]:
+        return [
+            e for e in os.scandir(self.cache_dir)
+            if e.is_file() and e.name.endswith(".json")
+        ]
+
+    def _remove(self, path: str) -> None:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def evict(self) -> None:
+        """Drop least recently used entries until within the size bounds."""
+        entries = sorted(self._entries(), key=lambda e: e.stat().st_mtime)
+        total = sum(e.stat().st_size for e in entries)
+        while entries and (len(entries) > self.max_entries or total > self.max_bytes):
+            oldest = entries.pop(0)
+            total -= oldest.stat().st_size
+            self._remove(oldest.path)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        for entry in self._entries():
+            self._remove(entry.path)
+
+    def stats(self) -> Dict[str, Union[int, float]]:
+        entries = self._entries()
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(entries),
+            "bytes": sum(e.stat().st_size for e in entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+        }
+
+
+class ChatCancelled(Exception):
+    """Raised inside a request when chat_cancel aborts it."""
+
+
+class ChatWorker:
+    """Run chat prompts in order on a background thread.
+
+    ``chat`` returns immediately; the agent's requests run on the worker
+    thread while every generated PyMOL command is handed to a
+    PyMOLCommandQueue drained on PyMOL's main thread, so the GUI stays
+    responsive for the whole completion.
+    """
+
+    command_timeout = 120
+
+    def __init__(self, agent: "PyMOLAgent", maxsize: int = 256):
+        self.agent = agent
+        self.prompts = queue.Queue()
+        self.command_queue = PyMOLCommandQueue(maxsize=maxsize)
+        self.current: Optional[str] = None
+        self.started_at = 0.0
+        self.commands_run = 0
+        self.completed = 0
+        self.last_response = ""
+        self._thread = None
+        self.agent.command_executor = self.run_command
+
+    def start(self) -> None:
+        self.command_queue.start()
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run_forever, daemon=True)
+            self._thread.start()
+
+    def run_command(self, command: str) -> None:
+        """Execute a command on the main thread and wait for it to finish.
+
+        Raises RuntimeError if the command fails or PyMOL does not run it
+        within command_timeout seconds.
+        """
+        if threading.current_thread() is threading.main_thread():
+            cmd.do(command)
+            self.commands_run += 1
+            return
+        job = self.command_queue.submit([command], block=True)
+        if not job["done"].wait(self.command_timeout):
+            raise RuntimeError(f"PyMOL did not run the command within {self.command_timeout}s")
+        result = job["results"][0]
+        if not result["ok"]:
+            raise RuntimeError(result["error"])
+        self.commands_run += 1
+
+    def chat(self, message: str, execute: bool = True) -> Optional[str]:
+        """PyMOL command: chat <message>"""
+        if not self.agent.async_chat:
+            return self.agent.send_message(message, execute)
+        self.start()
+        self.prompts.put((message, execute))
+        pending = self.prompts.qsize() + (1 if self.current else 0)
+        print(f"ChatMol: request queued ({pending} pending). Use chat_status / chat_cancel.")
+        return None
+
+    def _run_forever(self) -> None:
+        while True:
+            message, execute = self.prompts.get()
+            self.agent.cancel_event.clear()
+            self.current = message
+            self.started_at = time.time()
+            self.commands_run = 0
+            try:
+                self.last_response = self.agent.send_message(message, execute)
+            except Exception as e:
+                print(f"ChatMol error: {e}")
+            finally:
+                self.current = None
+                self.completed += 1
+
+    def status(self) -> Dict[str, Union[str, int, float, None]]:
+        """PyMOL command: chat_status"""
+        status = {
+            "current": self.current,
+            "elapsed_s": round(time.time() - self.started_at, 1) if self.current else 0.0,
+            "commands_run": self.commands_run,
+            "queued": self.prompts.qsize(),
+            "completed": self.completed,
+        }
+        if self.current:
+            print(f"Running: {self.current!r} ({status['elapsed_s']}s, {self.commands_run} commands run)")
+        else:
+            print("Idle.")
+        print(f"Queued: {status['queued']}, completed: {status['completed']}")
+        return status
+
+    def cancel(self, scope: str = "") -> str:
+        """PyMOL command: chat_cancel [all] — abort the running request (and the queue)."""
+        dropped = 0
+        if scope.strip().lower() == "all":
+            while True:
+                try:
+                    self.prompts.get_nowait()
+                    dropped += 1
+                except queue.Empty:
+                    break
+        if self.current:
+            self.agent.cancel_event.set()
+        msg = "Cancelling current request" if self.current else "No request in flight"
+        if dropped:
+            msg += f", dropped {dropped} queued prompt(s)"
+        print(msg)
+        return msg
+
+
+class ConversationJournal:
+    """Append-only, crash-safe log of conversation changes.
+
+    Each agent session writes to its own directory under ``root``: a
+    ``journal.jsonl`` (or ``journal.jsonl.gz``) with one record per message
+    or stash change, and a ``snapshot.json`` of the full state. Every
+    ``snapshot_every`` records the snapshot is rewritten atomically and the
+    journal restarted, so replaying a session reads at most one snapshot
+    plus ``snapshot_every`` records.
+    """
+
+    def __init__(
+        self,
+        root: str,
+        compress: bool = False,
+        snapshot_every: int = 50,
+        keep_sessions: int = 10,
+    ):
+        self.root = root
+        self.compress = compress
+        self.snapshot_every = snapshot_every
+        self.keep_sessions = keep_sessions
+        self.session_dir = os.path.join(
+            root, datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+        )
+        self.seq = 0
+        self.since_snapshot = 0
+        self.started = False
+        self._fh = None
+
+    @staticmethod
+    def journal_path(session_dir: str, compress: bool) -> str:
+        return os.path.join(session_dir, "journal.jsonl" + (".gz" if compress else ""))
+
+    def _open(self, mode: str = "a"):
+        path = self.journal_path(self.session_dir, self.compress)
+        if self.compress:
+            return gzip.open(path, mode + "t", encoding="utf-8")
+        return open(path, mode, encoding="utf-8")
+
+    def append(self, record: Dict) -> None:
+        """Append one record; cost is proportional to the record, not the history."""
+        if self._fh is None:
+            self._fh = self._open()
+        self.seq += 1
+        self.since_snapshot += 1
+        record["seq"] = self.seq
+        self._fh.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._fh.flush()
+
+    @property
+    def snapshot_due(self) -> bool:
+        return self.since_snapshot >= self.snapshot_every
+
+    def write_snapshot(self, state: Dict) -> None:
+        """Atomically persist the full state and restart the journal."""
+        if not self.started:
+            os.makedirs(self.session_dir, exist_ok=True)
+            self.started = True
+            self.prune()
+        snapshot = dict(state, seq=self.seq)
+        path = os.path.join(self.session_dir, "snapshot.json")
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        # Records up to `seq` are in the snapshot; start an empty journal
+        if self._fh is not None:
+            self._fh.close()
+        self._fh = self._open("w")
+        self.since_snapshot = 0
+
+    def close(self) -> None:
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+
+    def prune(self) -> None:
+        """Remove the oldest session directories beyond ``keep_sessions``."""
+        sessions = self.list_sessions(self.root)
+        for session_dir in sessions[: max(0, len(sessions) - self.keep_sessions)]:
+            for name in os.listdir(session_dir):
+                os.remove(os.path.join(session_dir, name))
+            os.rmdir(session_dir)
+
+    @staticmethod
+    def list_sessions(root: str) -> List[str]:
+        if not os.path.isdir(root):
+            return []
+        return sorted(
+            os.path.join(root, name)
+            for name in os.listdir(root)
+            if os.path.isfile(os.path.join(root, name, "snapshot.json"))
+        )
+
+    @classmethod
+    def replay(cls, session_dir: str) -> Dict:
+        """Rebuild the state of a session from its snapshot and journal."""
+        with open(os.path.join(session_dir, "snapshot.json"), "r", encoding="utf-8") as f:
+            state = json.load(f)
+        snapshot_seq = state.pop("seq", 0)
+        for compress in (False, True):
+            path = cls.journal_path(session_dir, compress)
+            if not os.path.exists(path):
+                continue
+            opener = gzip.open if compress else open
+            try:
+                with opener(path, "rt", encoding="utf-8") as f:
+                    for line in f:
+                        try:
+                            record = json.loads(line)
+                        except ValueError:
+                            break  # torn write at crash time
+                        if record.get("seq", 0) > snapshot_seq:
+                            cls.apply(state, record)
+            except (EOFError, OSError):
+                pass  # truncated gzip member; keep what was read
+        return state
+
+    @staticmethod
+    def apply(state: Dict, record: Dict) -> None:
+        op = record.get("op")
+        if op == "message":
+            state["conversation"].append(
+                {"role": record["role"], "content": record["content"]}
+            )
+        elif op == "pop":
+            state["conversation"].pop()
+        elif op == "stash":
+            state["stashed_commands"] = record["commands"]
+        elif op == "reset":
+            state["conversation"] = state["conversation"][:1]
+            state["summary"] = ""
+            state["stashed_commands"] = []
+
+
 class PyMOLAgent:
     OPENAI_MODELS = {
         "gpt-4o", "gpt-4o-mini"
@@ -79,6 +714,10 @@ class PyMOLAgent:
         model: str = "gpt-4o",
         provider: Optional[Literal["openai", "anthropic", "deepseek"]] = None,
         system_message: Optional[str] = None,
+        stream: bool = True,
+        token_estimator: Optional[Callable[[str], int]] = None,
+        use_cache: bool = True,
+        async_chat: bool = True,
     ):
         self.config_dir = os.path.expanduser("~/.PyMOL")
         self.config_file = os.path.join(self.config_dir, "config.json")
@@ -110,6 +749,18 @@ show cartoon
         self.conversation_history: List[Dict[str, str]] = [
             {"role": "system", "content": self.system_message}
         ]
+        # Summary of turns compacted out of conversation_history
+        self.conversation_summary = ""
+        self.window = ConversationWindow(
+            token_estimator=token_estimator,
+            budgets=self.config.get("token_budgets"),
+        )
+        # Replay identical requests from disk instead of calling the API
+        self.use_cache = use_cache
+        self.response_cache = ResponseCache.from_config(
+            os.path.join(self.config_dir, "response_cache"),
+            self.config.get("response_cache", {}),
+        )
         self.api_urls = {
             "openai": "https://api.openai.com/v1/chat/completions",
             "anthropic": "https://api.anthropic.com/v1/messages",
@@ -117,6 +768,31 @@ show cartoon
             "ollama": "http://localhost:11434/api/chat"
         }
         self.stashed_commands = []
+        # Stream tokens and run each command as soon as its line is complete
+        self.stream = stream
+        # Run `chat` on a background ChatWorker; commands go through command_executor
+        self.async_chat = async_chat
+        self.command_executor: Callable[[str], None] = cmd.do
+        self.cancel_event = threading.Event()
+        # Commands of the current turn that failed, reported with the answer
+        self.command_errors: List[Tuple[str, str]] = []
+        # Pooled connections, reused across turns (notably to localhost:11434)
+        self.http = requests.Session()
+        self.http.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=8))
+        self.http.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=8))
+        # How long Ollama keeps a model loaded after a request, e.g. "30m", "-1"
+        self.ollama_keep_alive = str(self.config.get("ollama_keep_alive", "30m"))
+        # Ollama model -> time.time() at which it is expected to be unloaded
+        self.ollama_resident: Dict[str, float] = {}
+        # Crash-safe autosave: append-only journal under ~/.PyMOL/journal
+        self.journal = None
+        self._journaled_stash: List[str] = []
+        if self.config.get("autosave", True):
+            self.journal = ConversationJournal(
+                os.path.join(self.config_dir, "journal"),
+                compress=self.config.get("journal_compress", False),
+                snapshot_every=self.config.get("journal_snapshot_every", 50),
+            )
 
     @classmethod
     def detect_provider(cls, model: str) -> str:
@@ -202,6 +878,8 @@ show cartoon
             self.model = model_name.split("@")[0]
             # self.base_url = "http://localhost:11434/api/chat"
             # self.base_url = "https://chatmol.org/ollama/api/chat"
+            if not self.is_model_hot(self.model):
+                self.preload_ollama_model(self.model)
 
             return f"Model updated to: {self.model}"
         
@@ -214,6 +892,127 @@ show cartoon
             
         return f"Model updated to: {self.model}"
 
+    @staticmethod
+    def keep_alive_seconds(keep_alive: str) -> float:
+        """Convert an Ollama keep_alive value ("30m", "1h", "300", "-1") to seconds."""
+        value = str(keep_alive).strip().lower()
+        units = {"s": 1, "m": 60, "h": 3600}
+        try:
+            if value and value[-1] in units:
+                seconds = float(value[:-1]) * units[value[-1]]
+            else:
+                seconds = float(value)
+        except ValueError:
+            return 300.0  # Ollama's default
+        return float("inf") if seconds < 0 else seconds
+
+    def keep_alive_param(self) -> Union[int, str]:
+        """keep_alive as Ollama expects it: a number of seconds or a duration like "5m"."""
+        try:
+            return int(self.ollama_keep_alive)
+        except ValueError:
+            return self.ollama_keep_alive
+
+    @staticmethod
+    def ollama_model_key(model: str) -> str:
+        """Tagged model name as /api/ps reports it ("llama3" -> "llama3:latest")."""
+        return model if ":" in model.rsplit("/", 1)[-1] else f"{model}:latest"
+
+    def mark_model_resident(self, model: str) -> None:
+        self.ollama_resident[self.ollama_model_key(model)] = (
+            time.time() + self.keep_alive_seconds(self.ollama_keep_alive)
+        )
+
+    def is_model_hot(self, model: str) -> bool:
+        """Whether `model` is expected to still be loaded in Ollama."""
+        return self.ollama_resident.get(self.ollama_model_key(model), 0.0) > time.time()
+
+    def ollama_url(self, endpoint: str) -> str:
+        return self.api_urls["ollama"].rsplit("/api/", 1)[0] + "/api/" + endpoint
+
+    def preload_ollama_model(self, model: str) -> threading.Thread:
+        """Load `model` into Ollama in the background so the first chat is fast."""
+
+        def _preload():
+            try:
+                # A generate request without a prompt only loads the model
+                response = self.http.post(
+                    self.ollama_url("generate"),
+                    json={"model": model, "keep_alive": self.keep_alive_param()},
+                    timeout=600,
+                )
+                response.raise_for_status()
+                self.mark_model_resident(model)
+                print(f"Ollama model {model} is loaded.")
+            except requests.exceptions.RequestException as e:
+                print(f"Warning: could not preload Ollama model {model}: {e}")
+
+        thread = threading.Thread(target=_preload, daemon=True)
+        thread.start()
+        return thread
+
+    def set_keep_alive(self, keep_alive: str = "30m") -> str:
+        """Set how long Ollama keeps the model loaded between requests."""
+        self.ollama_keep_alive = str(keep_alive).strip()
+        self.config["ollama_keep_alive"] = self.ollama_keep_alive
+        self.save_config(self.config)
+        if self.provider == "ollama":
+            self.preload_ollama_model(self.model)
+        return f"Ollama keep_alive set to {self.ollama_keep_alive}"
+
+    def ollama_status(self) -> Dict[str, float]:
+        """Refresh and print which Ollama models are currently loaded."""
+        try:
+            response = self.http.get(self.ollama_url("ps"), timeout=5)
+            response.raise_for_status()
+            loaded = {
+                self.ollama_model_key(m["name"])
+                for m in response.json().get("models", [])
+            }
+        except (requests.exceptions.RequestException, ValueError) as e:
+            print(f"Could not query Ollama: {e}")
+            return self.ollama_resident
+        for model in list(self.ollama_resident):
+            if model not in loaded:
+                del self.ollama_resident[model]
+        for name in loaded:
+            if not self.is_model_hot(name):
+                self.mark_model_resident(name)
+        print("Loaded Ollama models:", ", ".join(sorted(loaded)) or "(none)")
+        return self.ollama_resident
+
+    def set_streaming(self, enabled: Union[str, bool] = "on") -> str:
+        """Turn streamed, line-by-line command execution on or off."""
+        if isinstance(enabled, str):
+            enabled = enabled.strip().lower() in ("1", "on", "true", "yes")
+        self.stream = bool(enabled)
+        return f"Streaming {'enabled' if self.stream else 'disabled'}"
+
+    def set_cache(self, enabled: Union[str, bool] = "on") -> str:
+        """Turn the on-disk response cache on or off (bypass)."""
+        if isinstance(enabled, str):
+            enabled = enabled.strip().lower() in ("1", "on", "true", "yes")
+        self.use_cache = bool(enabled)
+        return f"Response cache {'enabled' if self.use_cache else 'bypassed'}"
+
+    def cache_stats(self) -> Dict[str, Union[int, float]]:
+        """Print and return response cache counters."""
+        stats = self.response_cache.stats()
+        print("Response cache:", ", ".join(f"{k}={v}" for k, v in stats.items()))
+        return stats
+
+    def clear_cache(self) -> str:
+        """Remove all cached responses."""
+        self.response_cache.clear()
+        return "Response cache cleared"
+
+    def set_async_chat(self, enabled: Union[str, bool] = "on") -> str:
+        """Run `chat` in the background (on) or block until it finishes (off)."""
+        if isinstance(enabled, str):
+            enabled = enabled.strip().lower() in ("1", "on", "true", "yes")
+        self.async_chat = bool(enabled)
+        return f"Background chat {'enabled' if self.async_chat else 'disabled'}"
+
     def get_headers(self) -> Dict[str, str]:
         """Get headers based on the current provider."""
         if self.provider == "anthropic":
@@ -239,7 +1038,8 @@ show cartoon
             messages = []
             
             # First add any previous messages
-            for msg in self.conversation_history[1:]:  # Skip system message
+            history = self.windowed_history()
+            for msg in history[1:]:  # Skip system message
                 if msg["role"] in ["user", "assistant"]:  # Only include user and assistant messages
                     messages.append({
                         "role": msg["role"],
@@ -250,14 +1050,16 @@ show cartoon
                 "model": self.model,
                 "messages": messages,
                 "max_tokens": 1024,
-                "system": self.system_message,
+                "system": history[0]["content"],
                 "temperature": 0.01,
+                "stream": self.stream,
             }
         elif self.provider == "ollama":
             return {
                 "model": self.model,
-                "messages": self.conversation_history,
-                "stream": False,
+                "messages": self.windowed_history(),
+                "stream": self.stream,
+                "keep_alive": self.keep_alive_param(),
                 "options": {
                     "seed": 101,
                     "temperature": 0
@@ -266,10 +1068,37 @@ show cartoon
         else:  # openai
             return {
                 "model": self.model,
-                "messages": self.conversation_history,
+                "messages": self.windowed_history(),
                 "temperature": 0.01,
+                "stream": self.stream,
             }
 
+    def compact_history(self) -> None:
+        """Fold old turns into the summary once the token budget is exceeded."""
+        history = self.conversation_history
+        self.conversation_history, self.conversation_summary = self.window.compact(
+            self.conversation_history, self.conversation_summary, self.model
+        )
+        if self.journal and self.conversation_history is not history:
+            self.journal.write_snapshot(self.conversation_state())
+
+    def windowed_history(self) -> List[Dict[str, str]]:
+        """Conversation to send: system prompt (plus summary) and recent turns."""
+        self.compact_history()
+        if not self.conversation_summary:
+            return self.conversation_history
+        system = self.conversation_history[0]["content"]
+        system += "\n\nSummary of the earlier conversation:\n" + self.conversation_summary
+        return [{"role": "system", "content": system}] + self.conversation_history[1:]
+
+    def set_token_budget(self, tokens: Union[str, int], model: Optional[str] = None) -> str:
+        """Set the history token budget for a model (default: current model)."""
+        model = (model or self.model).strip()
+        self.window.budgets[model] = int(tokens)
+        self.config.setdefault("token_budgets", {})[model] = int(tokens)
+        self.save_config(self.config)
+        return f"Token budget for {model} set to {int(tokens)}"
+
     def process_response(self, response_data: Dict) -> str:
         """Extract the assistant's message from the API response."""
         if self.provider == "anthropic":
@@ -279,6 +1108,68 @@ show cartoon
         else:  # openai
             return response_data["choices"][0]["message"]["content"]
 
+    def iter_stream_deltas(self, response: requests.Response) -> Iterator[str]:
+        """Yield text deltas from a streaming response.
+
+        OpenAI, DeepSeek and Anthropic stream server-sent events, Ollama
+        streams newline-delimited JSON.
+        """
+        for line in response.iter_lines(decode_unicode=True):
+            if not line:
+                continue
+            if self.provider == "ollama":
+                chunk = json.loads(line)
+                if chunk.get("error"):
+                    raise requests.exceptions.HTTPError(chunk["error"], response=response)
+                yield chunk.get("message", {}).get("content", "")
+                if chunk.get("done"):
+                    return
+                continue
+
+            if not line.startswith("data:"):
+                continue  # SSE "event:" lines and comments
+            data = line[len("data:"):].strip()
+            if data == "[DONE]":
+                return
+            chunk = json.loads(data)
+            if self.provider == "anthropic":
+                if chunk.get("type") == "error":
+                    raise requests.exceptions.HTTPError(
+                        chunk.get("error", {}).get("message", data), response=response
+                    )
+                if chunk.get("type") == "content_block_delta":
+                    yield chunk["delta"].get("text", "")
+                elif chunk.get("type") == "message_stop":
+                    return
+            else:  # openai, deepseek
+                choices = chunk.get("choices") or []
+                if choices:
+                    yield choices[0].get("delta", {}).get("content") or ""
+
+    def stream_response(self, payload: Dict, execute: bool) -> str:
+        """Send a streaming request, running commands as their lines complete."""
+        self.stashed_commands.clear()  # Clear previous commands
+        parser = PyMOLCommandStream(
+            lambda command: self.handle_command(command, execute)
+        )
+        chunks = []
+        with self.http.post(
+            self.api_urls[self.provider],
+            headers=self.get_headers(),
+            json=payload,
+            stream=True,
+        ) as response:
+            response.raise_for_status()
+            for delta in self.iter_stream_deltas(response):
+                if self.cancel_event.is_set():
+                    raise ChatCancelled()
+                if delta:
+                    chunks.append(delta)
+                    parser.feed(delta)
+        parser.close()
+        self.record_stash()
+        return "".join(chunks)
+
     def send_message(self, message: str, execute: bool = True) -> str:
         """Send a message and process PyMOL commands."""
         message = message.strip()
@@ -295,83 +1186,170 @@ show cartoon
 
         # Add user message to history
         self.add_message("user", message)
+        self.command_errors = []
 
         # Prepare and send API request
         payload = self.prepare_messages(message)
-        
+
         try:
-            response = requests.post(
-                self.api_urls[self.provider],
-                headers=self.get_headers(),
-                json=payload
-            )
-            response.raise_for_status()
+            cache_key = None
+            if self.use_cache:
+                cache_key = self.response_cache.make_key(
+                    self.provider, self.model, self.windowed_history()
+                )
+                assistant_message = self.response_cache.get(cache_key)
+                if assistant_message is not None:
+                    self.process_pymol_commands(assistant_message, execute)
+                    self.add_message("assistant", assistant_message)
+                    print("====================================")
+                    print("User:", message)
+                    print("Assistant (cached):", assistant_message)
+                    self.report_command_errors()
+                    print("====================================")
+                    return assistant_message
 
-            # Parse response
-            assistant_message = self.process_response(response.json())
+            if self.stream:
+                # Commands are executed (or stashed) while tokens arrive
+                assistant_message = self.stream_response(payload, execute)
+                self.add_message("assistant", assistant_message)
+            else:
+                response = self.http.post(
+                    self.api_urls[self.provider],
+                    headers=self.get_headers(),
+                    json=payload
+                )
+                response.raise_for_status()
+                if self.cancel_event.is_set():
+                    raise ChatCancelled()
 
-            # Add assistant's response to history
-            self.add_message("assistant", assistant_message)
+                # Parse response
+                assistant_message = self.process_response(response.json())
+
+                # Process PyMOL commands (stops early on chat_cancel)
+                self.process_pymol_commands(assistant_message, execute)
+
+                # Add assistant's response to history
+                self.add_message("assistant", assistant_message)
+
+            if self.provider == "ollama":
+                self.mark_model_resident(self.model)
+
+            if cache_key and assistant_message:
+                self.response_cache.put(cache_key, assistant_message)
 
-            # Process PyMOL commands
-            self.process_pymol_commands(assistant_message, execute)
-            
             print("====================================")
             print("User:", message)
             print("Assistant:", assistant_message)
+            self.report_command_errors()
             print("====================================")
             return assistant_message
 
-        except requests.exceptions.RequestException as e:
+        except ChatCancelled:
+            # Drop the unanswered prompt so the history stays well-formed
+            self.conversation_history.pop()
+            self.record({"op": "pop"})
+            print("Request cancelled.")
+            return "Request cancelled."
+
+        except (requests.exceptions.RequestException, ValueError) as e:
             error_msg = f"API call failed: {str(e)}"
             print(error_msg)
             return error_msg
 
+    def report_command_errors(self) -> None:
+        """Print the commands of this turn that failed to run."""
+        if not self.command_errors:
+            return
+        print(f"{len(self.command_errors)} command(s) failed:")
+        for command, error in self.command_errors:
+            print(f"  {command}: {error}")
+
     def add_message(self, role: str, content: str) -> None:
         """Add a message to the conversation history."""
+        self.record({"op": "message", "role": role, "content": content})
         self.conversation_history.append({"role": role, "content": content})
 
-    def reset_conversation(self) -> str:
-        """Reset the conversation history."""
-        self.conversation_history = [
-            {"role": "system", "content": self.system_message}
-        ]
-        return "Conversation reset."
-    
+    def conversation_state(self) -> Dict:
+        return {
+            "conversation": self.conversation_history,
+            "summary": self.conversation_summary,
+            "stashed_commands": self.stashed_commands,
+        }
+
+    def record(self, record: Dict) -> None:
+        """Append a change to the autosave journal (no-op when disabled)."""
+        if self.journal is None:
+            return
+        try:
+            if not self.journal.started or self.journal.snapshot_due:
+                self.journal.write_snapshot(self.conversation_state())
+            self.journal.append(record)
+        except OSError as e:
+            print(f"Warning: autosave failed, disabling journal: {e}")
+            self.journal = None
+
+    def record_stash(self) -> None:
+        """Journal the stashed commands if they changed since the last record."""
+        if self.stashed_commands != self._journaled_stash:
+            self._journaled_stash = list(self.stashed_commands)
+            self.record({"op": "stash", "commands": self._journaled_stash})
+
+    def resume_conversation(self, session_dir: str = "") -> str:
+        """Rebuild the conversation by replaying an autosave journal.
+
+        Defaults to the most recent session other than the current one.
+        """
+        root = os.path.join(self.config_dir, "journal")
+        if not session_dir:
+            current = self.journal.session_dir if self.journal else None
+            sessions = [
+                d for d in ConversationJournal.list_sessions(root) if d != current
+            ]
+            if not sessions:
+                return "No autosaved conversation to resume"
+            session_dir = sessions[-1]
+        state = ConversationJournal.replay(session_dir)
+        self.conversation_history = state["conversation"]
+        self.conversation_summary = state.get("summary", "")
+        self.stashed_commands = state.get("stashed_commands", [])
+        self._journaled_stash = list(self.stashed_commands)
+        if self.journal:
+            self.journal.write_snapshot(self.conversation_state())
+        return (
+            f"Resumed {len(self.conversation_history) - 1} messages "
+            f"from {session_dir}"
+        )
+
     def process_pymol_commands(self, response: str, execute: bool) -> None:
         """Extract and process PyMOL commands from the response."""
         try:
             self.stashed_commands.clear()  # Clear previous commands
-            command_blocks = []
-
-            # Extract command blocks
-            for i, block in enumerate(response.split("```")):
-                if i % 2 == 1:
-                    command_blocks.append(block)
-
-            # Process each command block
-            for command_block in command_blocks:
-                for command in command_block.split("\n"):
-                    command = command.strip()
-                    if (
-                        command
-                        and not command.startswith("#")
-                        and command != "python"
-                        and command != "pymol"
-                    ):
-                        # Handle inline comments
-                        if "#" in command:
-                            command = command[: command.index("#")].strip()
-
-                        if execute:
-                            print(f"{command}")
-                            cmd.do(command)
-                        else:
-                            self.stashed_commands.append(command)
+            parser = PyMOLCommandStream(
+                lambda command: self.handle_command(command, execute)
+            )
+            parser.feed(response)
+            parser.close()
+            self.record_stash()
 
+        except ChatCancelled:
+            raise
         except Exception as e:
             print(f"Error processing PyMOL commands: {e}")
 
+    def handle_command(self, command: str, execute: bool) -> None:
+        """Run a single extracted command, or stash it for later."""
+        if execute:
+            if self.cancel_event.is_set():
+                raise ChatCancelled()
+            print(f"{command}")
+            try:
+                self.command_executor(command)
+            except Exception as e:
+                print(f"Error running {command!r}: {e}")
+                self.command_errors.append((command, str(e)))
+        else:
+            self.stashed_commands.append(command)
+
     def execute_stashed_commands(self) -> str:
         """Execute all stashed commands."""
         if not self.stashed_commands:
@@ -379,9 +1357,13 @@ show cartoon
 
         for command in self.stashed_commands:
             print(f"Executing: {command}")
-            cmd.do(command)
+            try:
+                self.command_executor(command)
+            except Exception as e:
+                print(f"Error running {command!r}: {e}")
 
         self.stashed_commands.clear()
+        self.record_stash()
         return "Executed all stashed commands"
 
     def reset_conversation(self) -> str:
@@ -389,7 +1371,10 @@ show cartoon
         self.conversation_history = [
             self.conversation_history[0]
         ]  # Keep system message
+        self.conversation_summary = ""
         self.stashed_commands.clear()
+        self._journaled_stash = []
+        self.record({"op": "reset"})
         return "Conversation and command history cleared"
 
     def save_conversation(self, filename: str = None) -> None:
@@ -399,10 +1384,12 @@ show cartoon
                 f"pymol_conversation_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
             )
 
+        self.compact_history()
         with open(filename, "w", encoding="utf-8") as f:
             json.dump(
                 {
                     "conversation": self.conversation_history,
+                    "summary": self.conversation_summary,
                     "stashed_commands": self.stashed_commands,
                 },
                 f,
@@ -414,7 +1401,10 @@ show cartoon
         with open(filename, "r", encoding="utf-8") as f:
             data = json.load(f)
             self.conversation_history = data["conversation"]
+            self.conversation_summary = data.get("summary", "")
             self.stashed_commands = data["stashed_commands"]
+        if self.journal:
+            self.journal.write_snapshot(self.conversation_state())
 
     def query_qaserver(self, question: str) -> str:
         """Query the ChatMol-Lite server."""
@@ -443,7 +1433,10 @@ show cartoon
             if command == "" or command.startswith("#") or command.startswith("```"):
                 continue
             else:
-                cmd.do(command)
+                try:
+                    self.command_executor(command)
+                except Exception as e:
+                    print(f"Error running {command!r}: {e}")
         print("====================================")
         print("ChatMol-Lite:")
         for command in commands:
@@ -455,25 +1448,42 @@ show cartoon
 
 
 def start_server():
-    httpd = http.server.HTTPServer(("localhost", 8101), PyMOLCommandHandler)
+    httpd = http.server.ThreadingHTTPServer(("localhost", 8101), PyMOLCommandHandler)
+    httpd.daemon_threads = True
     httpd.serve_forever()
 
 
-def init_server():
+def init_server(queue_size: int = 32):
+    if PyMOLCommandHandler.command_queue is None:
+        PyMOLCommandHandler.command_queue = PyMOLCommandQueue(maxsize=int(queue_size))
+    # Started from the calling (main) thread so the Qt drain timer lives there
+    PyMOLCommandHandler.command_queue.start()
     server_thread = threading.Thread(target=start_server)
     server_thread.start()
     print("Server started")
 
 pymol_assistant = PyMOLAgent()
+chat_worker = ChatWorker(pymol_assistant)
 
 cmd.extend("set_api_key", pymol_assistant.set_api_key)
-cmd.extend("chat", pymol_assistant.send_message)
+cmd.extend("chat", chat_worker.chat)
+cmd.extend("chat_status", chat_worker.status)
+cmd.extend("chat_cancel", chat_worker.cancel)
+cmd.extend("set_async_chat", pymol_assistant.set_async_chat)
 cmd.extend("chatlite", pymol_assistant.chatlite)
 cmd.extend("update_model", pymol_assistant.update_model)
+cmd.extend("set_keep_alive", pymol_assistant.set_keep_alive)
+cmd.extend("ollama_status", pymol_assistant.ollama_status)
+cmd.extend("set_streaming", pymol_assistant.set_streaming)
+cmd.extend("set_token_budget", pymol_assistant.set_token_budget)
+cmd.extend("set_cache", pymol_assistant.set_cache)
+cmd.extend("cache_stats", pymol_assistant.cache_stats)
+cmd.extend("clear_cache", pymol_assistant.clear_cache)
 cmd.extend("init_server", init_server)
 
 
 cmd.extend("save_conversation", pymol_assistant.save_conversation)
 cmd.extend("load_conversation", pymol_assistant.load_conversation)
+cmd.extend("resume_conversation", pymol_assistant.resume_conversation)
 cmd.extend("execute_stashed_commands", pymol_assistant.execute_stashed_commands)
 cmd.extend("reset_conversation", pymol_assistant.reset_conversation)
\ No newline at end of file
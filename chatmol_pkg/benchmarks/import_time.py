@@ -0,0 +1,61 @@
+"""
+Import-time benchmark for the chatmol package.
+
+Runs `python -X importtime -c "import chatmol"` in a fresh interpreter and
+fails if the cumulative import time of chatmol exceeds the budget, or if any
+heavy dependency (provider SDKs, HTTP clients, asyncio) is imported eagerly.
+
+Usage:
+    python benchmarks/import_time.py [--budget-ms 50] [--runs 5]
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+
+DEFERRED_MODULES = ("openai", "anthropic", "requests", "httpx", "asyncio")
+
+def measure(python=sys.executable):
+    """Returns (cumulative chatmol import time in ms, set of imported top-level modules)."""
+    pkg_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=pkg_root + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    proc = subprocess.run(
+        [python, "-X", "importtime", "-c", "import chatmol"],
+        capture_output=True, text=True, env=env, check=True,
+    )
+    chatmol_us = None
+    modules = set()
+    for line in proc.stderr.splitlines():
+        m = re.match(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)", line)
+        if not m:
+            continue
+        name = m.group(4)
+        modules.add(name.split(".")[0])
+        if name == "chatmol":
+            chatmol_us = int(m.group(2))
+    if chatmol_us is None:
+        raise RuntimeError("chatmol import not found in -X importtime output")
+    return chatmol_us / 1000.0, modules
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--budget-ms", type=float, default=50.0)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    timings = []
+    for _ in range(args.runs):
+        ms, modules = measure()
+        timings.append(ms)
+    best = min(timings)
+    eager = sorted(set(DEFERRED_MODULES) & modules)
+    print(f"import chatmol: best {best:.1f} ms over {args.runs} runs (budget {args.budget_ms:.1f} ms)")
+    if eager:
+        print(f"FAIL: imported eagerly: {', '.join(eager)}")
+    if best > args.budget_ms:
+        print("FAIL: import time over budget")
+    return 1 if eager or best > args.budget_ms else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,32 +1,72 @@
 from .utils import ChatMol
 from .pymol_server import PymolServer
+from .sessions import SessionManager
+from .pymol_pool import PymolWorkerPool
 
-defaul_client = ChatMol()
+# The default client and session manager are created on first use, so
+# importing chatmol does not build API clients or read API keys.
+_default_client = None
+_session_manager = None
+
+def get_default_client():
+    global _default_client
+    if _default_client is None:
+        _default_client = ChatMol()
+    return _default_client
+
+def get_session_manager():
+    global _session_manager
+    if _session_manager is None:
+        _session_manager = SessionManager(get_default_client())
+    return _session_manager
+
+def __getattr__(name):
+    # Keep `chatmol.defaul_client` / `chatmol.session_manager` working, lazily
+    if name == "defaul_client":
+        return get_default_client()
+    if name == "session_manager":
+        return get_session_manager()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def get_session(session_id):
+    return get_session_manager().get(session_id)
 
 def chatlite(question):
-    return defaul_client.chatlite(question)
+    return get_default_client().chatlite(question)
 
 def chat_with_gpt(message):
-    return defaul_client.chat_with_gpt(message)
+    return get_default_client().chat_with_gpt(message)
 
 def chat_with_claude(message):
-    return defaul_client.chat_with_claude(message)
+    return get_default_client().chat_with_claude(message)
 
 def chat_with_chatmol_llm(message):
-    return defaul_client.chat_with_chatmol_llm(message)
+    return get_default_client().chat_with_chatmol_llm(message)
+
+async def achatlite(question):
+    return await get_default_client().achatlite(question)
+
+async def achat_with_gpt(message):
+    return await get_default_client().achat_with_gpt(message)
+
+async def achat_with_claude(message):
+    return await get_default_client().achat_with_claude(message)
+
+async def achat_with_chatmol_llm(message):
+    return await get_default_client().achat_with_chatmol_llm(message)
 
 def clear_stashed_commands():
-    return defaul_client.clear_stashed_commands()
+    return get_default_client().clear_stashed_commands()
 
 def clear_chat_history():
-    return defaul_client.clear_chat_history()
+    return get_default_client().clear_chat_history()
 
-def start_pymol_gui():
-    pymolserver = PymolServer(defaul_client)
+def start_pymol_gui(client=None):
+    pymolserver = PymolServer(client or get_default_client())
     pymolserver.start_pymol()
     return pymolserver
 
 def warnings():
-    return defaul_client.warnings
+    return get_default_client().warnings
 
-__version__ = "0.3.0"
\ No newline at end of file
+__version__ = "0.3.0"
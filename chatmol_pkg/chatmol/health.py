@@ -0,0 +1,102 @@
+import time
+import threading
+
+class ProviderHealth():
+    """
+    Cached, concurrent availability probes for the LLM providers of a ChatMol.
+
+    Each probe is the cheapest call the provider offers (a model lookup, or a
+    1-token completion for Anthropic) with its own timeout and no retries.
+    Results are cached for ttl seconds and shared by all sessions of the
+    client, so front-ends can read status() without touching the APIs.
+    """
+    PROVIDERS = ("openai", "anthropic", "chatmol")
+
+    def __init__(self, client, ttl=300, timeout=10):
+        self.cm = client
+        self.ttl = ttl
+        self.timeout = timeout
+        self._status = {}
+        self._lock = threading.Lock()
+
+    def _probe_openai(self, client):
+        client.with_options(timeout=self.timeout, max_retries=0).models.retrieve(self.cm.gpt_model)
+
+    def _probe_chatmol(self, client):
+        client.with_options(timeout=self.timeout, max_retries=0).models.list()
+
+    def _probe_anthropic(self, client):
+        client.with_options(timeout=self.timeout, max_retries=0).messages.create(
+            model=self.cm.claude_model,
+            max_tokens=1,
+            messages=[{"role": "user", "content": "Hi"}],
+        )
+
+    def _client_for(self, provider):
+        return {
+            "openai": lambda: self.cm.client,
+            "anthropic": lambda: self.cm.client_anthropic,
+            "chatmol": lambda: self.cm.client_chatmol,
+        }[provider]()
+
+    def probe(self, provider):
+        """Probes one provider now and returns its status dict."""
+        status = {
+            "provider": provider,
+            "available": False,
+            "latency": None,
+            "error": None,
+            "error_class": None,
+            "checked_at": time.time(),
+        }
+        client = self._client_for(provider)
+        if client is None:
+            status["error"] = f"{provider} API key not configured"
+            status["error_class"] = "NotConfigured"
+        else:
+            start = time.perf_counter()
+            try:
+                getattr(self, f"_probe_{provider}")(client)
+                status["available"] = True
+            except Exception as e:
+                status["error"] = str(e)
+                status["error_class"] = type(e).__name__
+            status["latency"] = time.perf_counter() - start
+        with self._lock:
+            self._status[provider] = status
+        return status
+
+    def _is_fresh(self, status):
+        return status is not None and time.time() - status["checked_at"] < self.ttl
+
+    def check(self, providers=None, force=False):
+        """
+        Returns {provider: status}, probing concurrently only the providers
+        whose cached status is missing, expired, or all of them if force.
+        """
+        from concurrent.futures import ThreadPoolExecutor
+
+        providers = list(providers or self.PROVIDERS)
+        with self._lock:
+            stale = [p for p in providers if force or not self._is_fresh(self._status.get(p))]
+        if stale:
+            # Resolve lazily-created clients once, before fanning out
+            self.cm.warnings
+            with ThreadPoolExecutor(max_workers=len(stale)) as pool:
+                list(pool.map(self.probe, stale))
+        return self.status(providers)
+
+    def status(self, providers=None):
+        """Returns the cached {provider: status} without making any API call."""
+        with self._lock:
+            return {
+                p: dict(self._status[p])
+                for p in (providers or self.PROVIDERS) if p in self._status
+            }
+
+    def invalidate(self, provider=None):
+        with self._lock:
+            if provider is None:
+                self._status.clear()
+            else:
+                self._status.pop(provider, None)
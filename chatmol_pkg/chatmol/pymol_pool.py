@@ -0,0 +1,199 @@
+import socket
+import threading
+import time
+from .pymol_server import PymolServer
+
+def free_port():
+    """Returns a TCP port on localhost that is currently unused."""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("localhost", 0))
+        return sock.getsockname()[1]
+
+class PymolWorkerPool():
+    """
+    Pool of headless PyMOL processes, each with its own XML-RPC port.
+
+    Sessions lease a worker with lease(session_id); the same session keeps
+    getting the same worker (affinity) until it releases it or stays idle for
+    longer than idle_timeout seconds; a worker counts as used whenever
+    run_commands is called on it. A monitor thread restarts workers whose
+    process exited, and those that are not leased but stop answering pings
+    ping_failures times in a row (a leased worker may be busy with a long
+    job, and PyMOL's XML-RPC server answers one request at a time). The pool
+    grows on demand up to max_size.
+    """
+    def __init__(self,
+                size=2,
+                max_size=None,
+                pymol_path='pymol',
+                idle_timeout=900,
+                health_interval=10,
+                ready_timeout=60,
+                ping_timeout=10,
+                ping_failures=3
+                ):
+        self.size = size
+        self.max_size = max_size or size
+        self.pymol_path = pymol_path
+        self.idle_timeout = idle_timeout
+        self.health_interval = health_interval
+        self.ready_timeout = ready_timeout
+        self.ping_timeout = ping_timeout
+        self.ping_failures = ping_failures
+        self.workers = []  # PymolServer instances
+        self._leases = {}  # session_id -> (worker, last_used)
+        self._lock = threading.Condition()
+        self._launching = 0  # workers being started outside the lock
+        self._failed_pings = {}  # id(worker) -> consecutive failed pings
+        self._monitor_thread = None
+        self._stopped = threading.Event()
+        self.restarts = 0
+        self.reclaimed = 0
+
+    def _launch(self, client=None):
+        worker = PymolServer(client)
+        worker.start_pymol(self.pymol_path, port=free_port(), headless=True, ready_timeout=self.ready_timeout)
+        return worker
+
+    def start(self):
+        """Launches the initial workers in parallel and starts the monitor."""
+        launched = []
+        errors = []
+
+        def _launch_one():
+            try:
+                launched.append(self._launch())
+            except RuntimeError as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=_launch_one) for _ in range(self.size)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        with self._lock:
+            self.workers.extend(launched)
+        for e in errors:
+            print(f"Failed to start PyMOL worker: {e}")
+        if self._monitor_thread is None:
+            self._monitor_thread = threading.Thread(target=self._monitor, daemon=True)
+            self._monitor_thread.start()
+        return self
+
+    def lease(self, session_id, client=None, timeout=None):
+        """
+        Returns the worker (a PymolServer) leased to session_id, leasing a free
+        one if needed. Blocks up to timeout seconds (forever if None) when all
+        workers are busy and the pool is at max_size.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            while True:
+                if session_id in self._leases:
+                    worker, _ = self._leases[session_id]
+                    break
+                leased = {id(w) for w, _ in self._leases.values()}
+                free = [w for w in self.workers if id(w) not in leased and w.is_alive()]
+                if free:
+                    worker = free[0]
+                    break
+                if len(self.workers) + self._launching < self.max_size:
+                    # Reserve the slot, then start PyMOL without holding the lock
+                    self._launching += 1
+                    self._lock.release()
+                    try:
+                        worker = self._launch()
+                    finally:
+                        self._lock.acquire()
+                        self._launching -= 1
+                        self._lock.notify_all()
+                    self.workers.append(worker)
+                    break
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError("No PyMOL worker available")
+                self._lock.wait(remaining)
+            if client is not None:
+                worker.cm = client
+            self._leases[session_id] = (worker, time.monotonic())
+            return worker
+
+    def release(self, session_id, reset=True):
+        """Returns the session's worker to the pool, clearing its PyMOL state."""
+        with self._lock:
+            lease = self._leases.pop(session_id, None)
+            self._lock.notify_all()
+        if lease and reset and lease[0].is_alive():
+            try:
+                lease[0].run_commands(["reinitialize"])
+            except OSError:
+                pass
+
+    def _restart(self, worker):
+        worker.stop()
+        replacement = self._launch(worker.cm)
+        with self._lock:
+            self.workers[self.workers.index(worker)] = replacement
+            for session_id, (leased, last_used) in list(self._leases.items()):
+                if leased is worker:
+                    print(f"PyMOL worker for session {session_id} crashed and was restarted; its scene was lost.")
+                    self._leases[session_id] = (replacement, last_used)
+            self.restarts += 1
+            self._lock.notify_all()
+
+    def _is_healthy(self, worker, leased):
+        if not worker.is_alive():
+            return False
+        if id(worker) in leased:
+            return True  # may be busy; only its process state is trusted
+        if worker.ping(timeout=self.ping_timeout):
+            self._failed_pings.pop(id(worker), None)
+            return True
+        failures = self._failed_pings.get(id(worker), 0) + 1
+        self._failed_pings[id(worker)] = failures
+        return failures < self.ping_failures
+
+    def _monitor(self):
+        while not self._stopped.wait(self.health_interval):
+            with self._lock:
+                leased = {id(w) for w, _ in self._leases.values()}
+            for worker in list(self.workers):
+                if self._stopped.is_set():
+                    return
+                if not self._is_healthy(worker, leased):
+                    self._failed_pings.pop(id(worker), None)
+                    try:
+                        self._restart(worker)
+                    except RuntimeError as e:
+                        print(f"Failed to restart PyMOL worker: {e}")
+            now = time.monotonic()
+            with self._lock:
+                leases = list(self._leases.items())
+            idle = [
+                session_id for session_id, (worker, leased_at) in leases
+                if now - max(leased_at, getattr(worker, "last_used", 0)) > self.idle_timeout
+            ]
+            for session_id in idle:
+                self.release(session_id)
+                self.reclaimed += 1
+
+    def status(self):
+        with self._lock:
+            return {
+                "workers": len(self.workers),
+                "alive": sum(1 for w in self.workers if w.is_alive()),
+                "leased": len(self._leases),
+                "ports": [w.port for w in self.workers],
+                "restarts": self.restarts,
+                "reclaimed": self.reclaimed,
+            }
+
+    def shutdown(self):
+        """Stops the monitor and all PyMOL processes."""
+        self._stopped.set()
+        with self._lock:
+            workers, self.workers = self.workers, []
+            self._leases.clear()
+            self._lock.notify_all()
+        for worker in workers:
+            worker.stop()
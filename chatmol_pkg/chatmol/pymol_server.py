@@ -1,65 +1,285 @@
+import os
+import re
+import time
 import subprocess, threading
-from xmlrpc import client
+from collections import deque, namedtuple
 from .utils import ChatMol
 
+ConsoleLine = namedtuple("ConsoleLine", ["seq", "stream", "text"])
+# Run inside PyMOL at launch; makes cmd.chatmol_run_batch callable over XML-RPC
+RPC_BATCH_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "rpc_batch.py")
+
+def _timeout_transport(timeout):
+    """XML-RPC transport whose connections time out, for health checks."""
+    from xmlrpc import client
+
+    class TimeoutTransport(client.Transport):
+        def make_connection(self, host):
+            conn = super().make_connection(host)
+            conn.timeout = timeout
+            return conn
+
+    return TimeoutTransport()
+
+class ConsoleBuffer():
+    """
+    Bounded, line-oriented ring buffer for PyMOL console output.
+
+    Every line gets a monotonically increasing sequence number, so readers can
+    poll with since(cursor) and never miss or repeat lines that are still
+    buffered. The oldest lines are dropped once max_lines or max_bytes is
+    exceeded.
+    """
+    def __init__(self, max_lines=5000, max_bytes=1024 * 1024):
+        self.max_lines = max_lines
+        self.max_bytes = max_bytes
+        self._lines = deque()
+        self._bytes = 0
+        self._next_seq = 0
+        self._lock = threading.Lock()
+
+    def append(self, text, stream="stdout"):
+        """Add one line and return its sequence number."""
+        text = text.rstrip("\r\n")
+        with self._lock:
+            seq = self._next_seq
+            self._next_seq += 1
+            self._lines.append(ConsoleLine(seq, stream, text))
+            self._bytes += len(text)
+            while self._lines and (len(self._lines) > self.max_lines or self._bytes > self.max_bytes):
+                self._bytes -= len(self._lines.popleft().text)
+        return seq
+
+    @property
+    def cursor(self):
+        """Sequence number the next line will get; pass it to since() later."""
+        return self._next_seq
+
+    def tail(self, n=20):
+        """Return the last n lines."""
+        with self._lock:
+            if n <= 0:
+                return []
+            start = max(0, len(self._lines) - n)
+            return [self._lines[i] for i in range(start, len(self._lines))]
+
+    def since(self, cursor):
+        """
+        Return (lines, next_cursor) for all buffered lines with seq >= cursor.
+        Lines that were already evicted are skipped.
+        """
+        with self._lock:
+            if not self._lines or cursor >= self._next_seq:
+                return [], self._next_seq
+            offset = max(0, cursor - self._lines[0].seq)
+            lines = [self._lines[i] for i in range(offset, len(self._lines))]
+            return lines, self._next_seq
+
+    def search(self, pattern, stream=None, flags=0):
+        """Return buffered lines matching a regular expression."""
+        regex = re.compile(pattern, flags)
+        with self._lock:
+            lines = list(self._lines)
+        return [
+            line for line in lines
+            if (stream is None or line.stream == stream) and regex.search(line.text)
+        ]
+
+    def text(self, n=None):
+        """Buffered output (or its last n lines) as one newline-joined string."""
+        with self._lock:
+            lines = list(self._lines)
+        if n is not None:
+            lines = lines[-n:] if n > 0 else []
+        return "\n".join(line.text for line in lines)
+
+    def __len__(self):
+        return len(self._lines)
+
 class PymolServer():
-    def __init__(self, default_client:ChatMol):
+    def __init__(self, default_client:ChatMol, console_max_lines=5000, console_max_bytes=1024 * 1024):
         self.cm = default_client
-        self.pymol_console = ""
+        self.console = ConsoleBuffer(max_lines=console_max_lines, max_bytes=console_max_bytes)
+        self._batch_supported = True
+        self.last_used = time.monotonic()
+
+    @property
+    def pymol_console(self):
+        """Buffered PyMOL console output (stdout and stderr) as text."""
+        return self.console.text()
 
-    def start_pymol(self, pymol_path='pymol'):
+    def start_pymol(self, pymol_path='pymol', port=None, headless=False, ready_timeout=None):
         """
         Starts PyMOL using a subprocess and captures its stdout in a non-blocking way.
         
         Args:
         pymol_path (str): Path to the PyMOL executable. Default is 'pymol'.
+        port (int): XML-RPC port. Default None uses PyMOL's own default (9123).
+        headless (bool): Run without GUI (pymol -c), kept alive for XML-RPC calls.
+        ready_timeout (float): If set, wait up to this many seconds for the
+            XML-RPC server to answer and raise RuntimeError otherwise.
         """
+        if port is None and not headless:
+            args = [pymol_path, RPC_BATCH_SCRIPT, "-R"]
+            self.port = 9123
+        else:
+            self.port = port or 9123
+            launch = f"import pymol.rpc; pymol.rpc.launch_XMLRPC(port={self.port}, nToTry=1)"
+            args = [pymol_path, "-cqK" if headless else "-q", RPC_BATCH_SCRIPT, "-d", launch]
         # Start PyMOL as a subprocess
         self.pymol_process = subprocess.Popen(
-            "pymol -R",
+            args,
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
             text=True,
-            shell=True,
             bufsize=1,  # Line-buffered
             universal_newlines=True
         )
-        self.server = client.ServerProxy(uri="http://localhost:9123/RPC2")
+        from xmlrpc import client
+        self.server = client.ServerProxy(uri=f"http://localhost:{self.port}/RPC2")
 
         # Check if the process has started correctly
         if self.pymol_process.stdout is None:
             print("Failed to start PyMOL process.")
             return 
 
-        # Start a thread to listen to the output
+        # Start one thread per pipe to listen to the output
         self.stdout_thread = threading.Thread(target=self.get_stdout)
         self.stdout_thread.start()
+        self.stderr_thread = threading.Thread(target=self.get_stderr)
+        self.stderr_thread.start()
 
-    def get_stdout(self):
-        """
-        Prints the stdout of the PyMol subprocess continuously.
-        """
+        if ready_timeout is not None and not self.wait_until_ready(ready_timeout):
+            self.stop()
+            raise RuntimeError(f"PyMOL XML-RPC server on port {self.port} did not become ready in {ready_timeout}s")
+
+    def ping(self, timeout=2.0):
+        """Returns True if the PyMOL XML-RPC server answers."""
+        from xmlrpc import client
+        proxy = client.ServerProxy(
+            uri=f"http://localhost:{self.port}/RPC2",
+            transport=_timeout_transport(timeout),
+        )
+        try:
+            proxy.ping()
+        except client.Fault:
+            pass  # no ping method, but the server answered
+        except (OSError, client.ProtocolError):
+            return False
+        return True
+
+    def wait_until_ready(self, timeout=30.0, interval=0.2):
+        """Polls the XML-RPC server until it answers, the process dies or timeout expires."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.pymol_process.poll() is not None:
+                return False
+            if self.ping():
+                return True
+            time.sleep(interval)
+        return False
+
+    def is_alive(self):
+        return getattr(self, "pymol_process", None) is not None and self.pymol_process.poll() is None
+
+    def stop(self, timeout=5.0):
+        """Terminates the PyMOL subprocess."""
+        if not self.is_alive():
+            return
+        self.pymol_process.terminate()
+        try:
+            self.pymol_process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            self.pymol_process.kill()
+
+    def _read_stream(self, pipe, name):
         # This function runs in a separate thread
-        if self.pymol_process is not None:
+        if self.pymol_process is not None and pipe is not None:
             while True:
-                output = self.pymol_process.stdout.readline()
+                output = pipe.readline()
                 if output == '' and self.pymol_process.poll() is not None:
                     break
                 if output:
-                    self.pymol_console += output.strip()
-                    # print(output.strip())
-            self.pymol_process.stdout.close()
+                    self.console.append(output, stream=name)
+            pipe.close()
+
+    def get_stdout(self):
+        """
+        Captures the stdout of the PyMol subprocess into the console buffer.
+        """
+        self._read_stream(self.pymol_process.stdout, "stdout")
+
+    def get_stderr(self):
+        """
+        Captures the stderr of the PyMol subprocess into the console buffer.
+        """
+        self._read_stream(self.pymol_process.stderr, "stderr")
+
+    def run_commands(self, commands):
+        """
+        Executes a list of PyMOL commands in a single XML-RPC round trip.
+
+        Uses the chatmol_run_batch function that start_pymol loads into PyMOL
+        and falls back to one call per command on servers without it.
+
+        Returns:
+        list of dict: one entry per command with 'command', 'ok', 'result',
+        'error' and 'elapsed' (seconds).
+        """
+        from xmlrpc import client
+        commands = [command.strip() for command in commands if command.strip()]
+        if not commands:
+            return []
+        self.last_used = time.monotonic()
+        if self._batch_supported:
+            start = time.perf_counter()
+            try:
+                outputs = self.server.chatmol_run_batch(commands)
+            except client.Fault:
+                # PyMOL was not started by start_pymol, so the batch function is missing
+                self._batch_supported = False
+            except (OSError, client.ProtocolError) as e:
+                # Server unreachable: none of the commands ran
+                elapsed = (time.perf_counter() - start) / len(commands)
+                return [
+                    {"command": command, "ok": False, "result": None, "error": str(e), "elapsed": elapsed}
+                    for command in commands
+                ]
+            else:
+                return [
+                    {"command": command, "ok": ok, "result": None, "error": error, "elapsed": elapsed}
+                    for command, (ok, error, elapsed) in zip(commands, outputs)
+                ]
+
+        results = []
+        for command in commands:
+            start = time.perf_counter()
+            try:
+                out = self.server.do(command)
+                results.append({"command": command, "ok": True, "result": out, "error": "", "elapsed": time.perf_counter() - start})
+            except Exception as e:
+                results.append({"command": command, "ok": False, "result": None, "error": str(e), "elapsed": time.perf_counter() - start})
+        return results
+
+    def _execute(self, commands):
+        results = self.run_commands(commands)
+        for result in results:
+            if not result["ok"]:
+                print(f"Error during command execution: {result['command']}: {result['error']}")
+        return results
 
     def chatlite(self, question):
         answer = self.cm.chatlite(question)
         commands = answer.split('\n')
         print("Answers from ChatMol-Lite: ")
+        to_run = []
         for command in commands:
             if command == '':
                 continue
             else:
                 print(command)
-                self.server.do(command)
+                to_run.append(command)
+        self._execute(to_run)
         return answer
 
     def chatgpt(self, message, execute:bool=True, lite:bool=False):
@@ -70,8 +290,7 @@ class PymolServer():
             if len(self.cm.stashed_commands) == 0:
                 print("There is no stashed commands")
             else:
-                for command in self.cm.stashed_commands:
-                    self.server.do(command)
+                self._execute(self.cm.stashed_commands)
                 self.cm.clear_stashed_commands()
             return 0
         
@@ -88,6 +307,7 @@ class PymolServer():
 
         try:
             command_blocks = []
+            to_run = []
             self.cm.clear_stashed_commands()
             for i, block in enumerate(response.split("```")):
                 if i % 2 == 1:
@@ -101,9 +321,10 @@ class PymolServer():
                             command, comment = command.split("#")
                         if execute:
                             print(command)
-                            self.server.do(command)
+                            to_run.append(command)
                         else:
                             self.cm.stashed_commands.append(command)
+            self._execute(to_run)
         except Exception as e:
             print(f"Error during command execution: {e}")
         return response
@@ -114,8 +335,7 @@ class PymolServer():
             if len(self.cm.stashed_commands) == 0:
                 print("There is no stashed commands")
             else:
-                for command in self.cm.stashed_commands:
-                    self.server.do(command)
+                self._execute(self.cm.stashed_commands)
                 self.cm.clear_stashed_commands()
             return 0
         
@@ -132,6 +352,7 @@ class PymolServer():
 
         try:
             command_blocks = []
+            to_run = []
             self.cm.clear_stashed_commands()
             for i, block in enumerate(response.split("```")):
                 if i % 2 == 1:
@@ -145,9 +366,10 @@ class PymolServer():
                             command, comment = command.split("#")
                         if execute:
                             print(command)
-                            self.server.do(command)
+                            to_run.append(command)
                         else:
                             self.cm.stashed_commands.append(command)
+            self._execute(to_run)
         except Exception as e:
             print(f"Error during command execution: {e}")
         return response
@@ -158,8 +380,7 @@ class PymolServer():
             if len(self.cm.stashed_commands) == 0:
                 print("There is no stashed commands")
             else:
-                for command in self.cm.stashed_commands:
-                    self.server.do(command)
+                self._execute(self.cm.stashed_commands)
                 self.cm.clear_stashed_commands()
             return 0
         
@@ -175,6 +396,7 @@ class PymolServer():
         print("ChatMol:", response)
         try:
             command_blocks = []
+            to_run = []
             self.cm.clear_stashed_commands()
             for i, block in enumerate(response.split("```")):
                 if i % 2 == 1:
@@ -188,9 +410,10 @@ class PymolServer():
                             command, comment = command.split("#")
                         if execute:
                             print(command)
-                            self.server.do(command)
+                            to_run.append(command)
                         else:
                             self.cm.stashed_commands.append(command)
+            self._execute(to_run)
         except Exception as e:
             print(f"Error during command execution: {e}")
         return response
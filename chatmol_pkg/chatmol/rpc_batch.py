@@ -0,0 +1,41 @@
+"""
+Batch command execution for PyMOL's XML-RPC server.
+
+PymolServer.start_pymol passes this file to PyMOL, so it runs inside the PyMOL
+process and is never imported by chatmol itself. PyMOL registers its cmd
+module with the XML-RPC server, so anything attached to cmd can be called
+remotely: server.chatmol_run_batch(commands) runs a whole list of commands in
+one round trip.
+"""
+import time
+from pymol import cmd, parser
+
+# A parser of our own, so batches run on the XML-RPC thread never share
+# nesting state with the command line
+_parser = parser.Parser(cmd)
+
+def chatmol_run_batch(commands):
+    """
+    Runs PyMOL commands in order with screen updates deferred.
+
+    Returns one [ok, error, elapsed] list per command. PyMOL prints the
+    details of a failed command to its console; error only says which
+    command failed.
+    """
+    defer = cmd.get_setting_int("defer_updates")
+    cmd.set("defer_updates", 1)
+    results = []
+    try:
+        for command in commands:
+            start = time.perf_counter()
+            try:
+                ok = _parser.parse(command, 0) == 1
+                error = "" if ok else f"PyMOL reported an error for: {command}"
+            except Exception as e:
+                ok, error = False, str(e)
+            results.append([ok, error, time.perf_counter() - start])
+    finally:
+        cmd.set("defer_updates", defer)
+    return results
+
+cmd.chatmol_run_batch = chatmol_run_batch
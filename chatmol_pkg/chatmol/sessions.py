@@ -0,0 +1,126 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from .utils import ChatMol
+
+class SessionManager():
+    """
+    Gives every session ID its own ChatMol conversation state.
+
+    Sessions share the API clients of one base ChatMol. The number of
+    resident sessions is capped; the least recently used (and any idle
+    longer than idle_timeout seconds) are written to spill_dir and loaded
+    back transparently on their next use. Each session's histories are
+    trimmed, oldest entries first, to at most max_session_bytes.
+    """
+    def __init__(self,
+                base_client:ChatMol=None,
+                max_resident=64,
+                idle_timeout=1800,
+                max_session_bytes=256 * 1024,
+                spill_dir=None
+                ):
+        self.base_client = base_client
+        self.max_resident = max_resident
+        self.idle_timeout = idle_timeout
+        self.max_session_bytes = max_session_bytes
+        self.spill_dir = spill_dir or os.path.expanduser('~')+"/.cache/chatmol/sessions"
+        self._sessions = OrderedDict()  # session_id -> (ChatMol, last_used)
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self.loads = 0
+
+    def _base(self):
+        if self.base_client is None:
+            self.base_client = ChatMol()
+        return self.base_client
+
+    def _spill_path(self, session_id):
+        name = hashlib.sha256(str(session_id).encode("utf-8")).hexdigest()
+        return os.path.join(self.spill_dir, name + ".json")
+
+    def get(self, session_id):
+        """Returns the ChatMol for session_id, creating or reloading it as needed."""
+        with self._lock:
+            if session_id in self._sessions:
+                session, _ = self._sessions.pop(session_id)
+            else:
+                session = self._base().new_session()
+                path = self._spill_path(session_id)
+                if os.path.exists(path):
+                    with open(path, "r") as f:
+                        session.import_state(json.load(f))
+                    os.remove(path)
+                    self.loads += 1
+            self._trim(session)
+            self._sessions[session_id] = (session, time.time())
+            self._evict_locked()
+            return session
+
+    def drop(self, session_id):
+        """Forgets a session, including any copy on disk."""
+        with self._lock:
+            self._sessions.pop(session_id, None)
+            path = self._spill_path(session_id)
+            if os.path.exists(path):
+                os.remove(path)
+
+    def evict_idle(self):
+        """Spills sessions idle for longer than idle_timeout to disk."""
+        with self._lock:
+            self._evict_locked()
+
+    def _evict_locked(self):
+        now = time.time()
+        while self._sessions:
+            session_id, (session, last_used) = next(iter(self._sessions.items()))
+            if len(self._sessions) <= self.max_resident and now - last_used <= self.idle_timeout:
+                break
+            self._spill(session_id, session)
+            del self._sessions[session_id]
+            self.evictions += 1
+
+    def _spill(self, session_id, session):
+        os.makedirs(self.spill_dir, exist_ok=True)
+        with open(self._spill_path(session_id), "w") as f:
+            json.dump(session.export_state(), f)
+
+    @staticmethod
+    def session_bytes(session):
+        return len(json.dumps(session.export_state()))
+
+    def _trim(self, session):
+        """Drops the oldest history entries until the session fits its cap."""
+        while self.session_bytes(session) > self.max_session_bytes:
+            histories = [
+                getattr(session, name) for name, empty in ChatMol.SESSION_STATE.items()
+                if isinstance(empty, list) and getattr(session, name)
+            ]
+            if histories:
+                history = max(histories, key=lambda h: len(json.dumps(h)))
+                history.pop(0)
+                # Keep chat histories starting with a user turn
+                while history and isinstance(history[0], dict) and history[0].get("role") == "assistant":
+                    history.pop(0)
+            elif session.lite_conversation_history:
+                keep = len(session.lite_conversation_history) // 2
+                session.lite_conversation_history = session.lite_conversation_history[-keep:] if keep else ""
+            else:
+                break
+
+    def metrics(self):
+        with self._lock:
+            resident = [session for session, _ in self._sessions.values()]
+            spilled = 0
+            if os.path.isdir(self.spill_dir):
+                spilled = len([n for n in os.listdir(self.spill_dir) if n.endswith(".json")])
+            return {
+                "resident_sessions": len(resident),
+                "resident_bytes": sum(self.session_bytes(s) for s in resident),
+                "spilled_sessions": spilled,
+                "evictions": self.evictions,
+                "loads": self.loads,
+            }
@@ -1,10 +1,22 @@
 import os
-import requests
+import copy
 import json
-from openai import OpenAI
-import anthropic
+import threading
+from .health import ProviderHealth
+
+# Provider SDKs, requests, httpx and asyncio are imported on first use so that
+# `import chatmol` stays cheap for CLI tools and PyMOL startup scripts.
 
 class ChatMol:
+    # Per-session attributes, with their empty values
+    SESSION_STATE = {
+        "lite_conversation_history": "",
+        "chatgpt_conversation_history": [],
+        "claude_conversation_messages": [],
+        "chatmol_llm_conversation_history": [],
+        "stashed_commands": [],
+    }
+
     def __init__(self,
                 openai_api_key=None, 
                 verbose=False,
@@ -20,10 +32,10 @@ class ChatMol:
             self.stashed_commands = []
         self.API_KEY_FILE = os.path.expanduser('~')+"/.cache/chatmol/apikey.json"
         self.OPENAI_KEY_ENV = "OPENAI_API_KEY"
-        self.client = None
-        self.client_anthropic = None
-        self.warnings = []
-        self.init_clients()
+        # API clients are created on first access and shared by new_session() copies
+        self._clients = {}
+        self._clients_lock = threading.Lock()
+        self.health = ProviderHealth(self)
         self.lite_conversation_history = ""
         self.chatgpt_conversation_history = []
         self.claude_conversation_messages = []
@@ -41,6 +53,12 @@ class ChatMol:
         self.chatgpt_temp = chatgpt_temp
         self.chatgpt_max_tokens = chatgpt_max_tokens
         self.verbose = False
+        # Async clients, their connection pool and the per-provider limiters
+        # are created on first use in one dict that new_session() copies share;
+        # only this instance closes them
+        self.async_max_concurrency = {"openai": 8, "anthropic": 8, "chatmol": 4, "qaserver": 4}
+        self._async = {"loop": None}
+        self._owns_async = True
 
     def set_api_key(self, name, api_key):
         current_api_keys = {}
@@ -70,82 +88,194 @@ class ChatMol:
             print("API key file not found. Please set your API key using 'set_api_key' method or by environment variable.")
             return None
         
-    def test_api_access(self):
+    def api_status(self, refresh=False):
+        """
+        Returns {provider: status} with availability, latency and error class.
+
+        Cached probes younger than self.health.ttl are reused; refresh=True
+        probes all providers again.
+        """
+        return self.health.check(force=refresh)
+
+    def test_api_access(self, refresh=True):
         test_result = {}
-        if self.client_anthropic is not None:
-            try:
-                response = self.client_anthropic.messages.create(
-                    model=self.claude_model,
-                    system=self.chatgpt_sys_prompt,
-                    max_tokens=self.chatgpt_max_tokens,
-                    messages=[{"role": "user", "content": "Hello"}],
-                    temperature=self.chatgpt_temp
-                )
-                print(f"Anthropic API access test successful: {response}")
-                test_result["anthropic_failure"] = False
-            except Exception as e:
-                print(f"Anthropic API access test failed: {e}")
-                test_result["anthropic_failure"] = f"Error: {e}"
-        if self.client is not None:
-            try:
-                response = self.client.chat.completions.create(
-                    model=self.gpt_model,
-                    messages=[{"role": "user", "content": "Hello"}],
-                    max_tokens=self.chatgpt_max_tokens,
-                    temperature=self.chatgpt_temp
-                )
-                print(f"OpenAI API access test successful: {response}")
-                test_result["openai_failure"] = False
-            except Exception as e:
-                print(f"OpenAI API access test failed: {e}")
-                test_result["openai_failure"] = f"Error: {e}"
+        status = self.health.check(providers=["anthropic", "openai"], force=refresh)
+        for provider, name in [("anthropic", "Anthropic"), ("openai", "OpenAI")]:
+            if status[provider]["error_class"] == "NotConfigured":
+                continue
+            if status[provider]["available"]:
+                print(f"{name} API access test successful ({status[provider]['latency']:.2f}s)")
+                test_result[f"{provider}_failure"] = False
+            else:
+                print(f"{name} API access test failed: {status[provider]['error']}")
+                test_result[f"{provider}_failure"] = f"Error: {status[provider]['error']}"
         return test_result
 
-
     def init_clients(self):
-        self.client_chatmol = OpenAI(
+        from openai import OpenAI
+        import anthropic
+
+        clients = {"warnings": []}
+        clients["chatmol"] = OpenAI(
             api_key="0",
             base_url="https://llm.cloudmol.org/v1"
         )
 
         if os.environ.get("ANTHROPIC_API_KEY"):
-            self.client_anthropic = anthropic.Anthropic(api_key=os.environ.get("ANTHROPIC_API_KEY"))
-        elif api_key := self.load_api_key("anthropic") != "":
-            self.client_anthropic = anthropic.Anthropic(api_key=api_key)
+            clients["anthropic"] = anthropic.Anthropic(api_key=os.environ.get("ANTHROPIC_API_KEY"))
+        elif api_key := self.load_api_key("anthropic"):
+            clients["anthropic"] = anthropic.Anthropic(api_key=api_key)
         else:
             Warning("ANTHROPIC_API_KEY environment variable not found.")
-            self.warnings.append("ANTHROPIC_API_KEY environment variable not found.")
-            self.client_anthropic = None
+            clients["warnings"].append("ANTHROPIC_API_KEY environment variable not found.")
+            clients["anthropic"] = None
         if os.environ.get("OPENAI_API_KEY"):
-            self.client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
-        elif api_key := self.load_api_key("openai") != "":
-            self.client = OpenAI(api_key=api_key)
+            clients["openai"] = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+        elif api_key := self.load_api_key("openai"):
+            clients["openai"] = OpenAI(api_key=api_key)
         else:
             Warning("OPENAI_API_KEY environment variable not found.")
-            self.warnings.append("OPENAI_API_KEY environment variable not found.")
-            self.client = None
+            clients["warnings"].append("OPENAI_API_KEY environment variable not found.")
+            clients["openai"] = None
+        # Update in place so sessions sharing this dict see the new clients
+        self._clients.update(clients)
 
-    def query_qaserver(self, question):
-        
+    def _get_client(self, name):
+        if not self._clients:
+            with self._clients_lock:
+                if not self._clients:
+                    self.init_clients()
+        return self._clients[name]
+
+    @property
+    def client(self):
+        return self._get_client("openai")
+
+    @client.setter
+    def client(self, value):
+        self._get_client("openai")
+        self._clients["openai"] = value
+        self.health.invalidate("openai")
+
+    @property
+    def client_anthropic(self):
+        return self._get_client("anthropic")
+
+    @client_anthropic.setter
+    def client_anthropic(self, value):
+        self._get_client("anthropic")
+        self._clients["anthropic"] = value
+        self.health.invalidate("anthropic")
+
+    @property
+    def client_chatmol(self):
+        return self._get_client("chatmol")
+
+    @client_chatmol.setter
+    def client_chatmol(self, value):
+        self._get_client("chatmol")
+        self._clients["chatmol"] = value
+        self.health.invalidate("chatmol")
+
+    @property
+    def warnings(self):
+        return self._get_client("warnings")
+
+    def init_async_clients(self):
+        """
+        Creates the async API clients for the running event loop.
+
+        All clients share one httpx connection pool, and sessions from
+        new_session() share the pool and the per-provider limiters with this
+        instance. Clients and limiters are bound to an event loop, so they are
+        recreated if called from a different loop.
+        """
+        import asyncio
+        loop = asyncio.get_running_loop()
+        if self._async["loop"] is loop:
+            return
+        import httpx
+        import anthropic
+        from openai import AsyncOpenAI
+
+        http = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+            timeout=httpx.Timeout(120.0, connect=10.0),
+        )
+        state = {
+            "loop": loop,
+            "http": http,
+            "limits": {
+                name: asyncio.Semaphore(limit) for name, limit in self.async_max_concurrency.items()
+            },
+            "chatmol": AsyncOpenAI(
+                api_key="0",
+                base_url="https://llm.cloudmol.org/v1",
+                http_client=http,
+            ),
+            "openai": None,
+            "anthropic": None,
+        }
+        if self.client is not None:
+            state["openai"] = AsyncOpenAI(api_key=self.client.api_key, http_client=http)
+        if self.client_anthropic is not None:
+            state["anthropic"] = anthropic.AsyncAnthropic(
+                api_key=self.client_anthropic.api_key, http_client=http
+            )
+        # Update in place so sessions sharing this dict use the same pool
+        self._async.clear()
+        self._async.update(state)
+
+    async def aclose(self):
+        """
+        Closes the shared async connection pool. Sessions from new_session()
+        leave it open; it belongs to the ChatMol they were created from.
+        """
+        if not self._owns_async:
+            return
+        http = self._async.get("http")
+        self._async.clear()
+        self._async["loop"] = None
+        if http is not None:
+            await http.aclose()
+
+    def _qaserver_request(self, question):
         headers = {
             'Content-Type': 'application/x-www-form-urlencoded',
         }
-        
         question = self.lite_conversation_history + "Instructions: " + question
         data = 'question=' + question.replace('"','')
+        return headers, data
 
+    def _qaserver_answer(self, status_code, text):
+        if status_code == 200:
+            data = json.loads(text)
+            self.lite_conversation_history = data['conversation_history']
+            self.lite_conversation_history += "\nAnswer: "
+            self.lite_conversation_history += data['answer']
+            self.lite_conversation_history += "\n"
+            return data['answer']
+        else:
+            print(f"Failed to query server: {status_code} - {text}")
+            return None
+
+    def query_qaserver(self, question):
+        import requests
+        headers, data = self._qaserver_request(question)
         try:
             response = requests.post('https://chatmol.org/qa/lite/', headers=headers, data=data)
-            if response.status_code == 200:
-                data = json.loads(response.text)
-                self.lite_conversation_history = data['conversation_history']
-                self.lite_conversation_history += "\nAnswer: "
-                self.lite_conversation_history += data['answer']
-                self.lite_conversation_history += "\n"
-                return data['answer']
-            else:
-                print(f"Failed to query server: {response.status_code} - {response.text}")
-                return None
+            return self._qaserver_answer(response.status_code, response.text)
+        except Exception as e:
+            print(f"Error querying server: {e}")
+            return None
+
+    async def aquery_qaserver(self, question):
+        self.init_async_clients()
+        headers, data = self._qaserver_request(question)
+        try:
+            async with self._async["limits"]["qaserver"]:
+                response = await self._async["http"].post('https://chatmol.org/qa/lite/', headers=headers, content=data)
+            return self._qaserver_answer(response.status_code, response.text)
         except Exception as e:
             print(f"Error querying server: {e}")
             return None
@@ -162,84 +292,164 @@ class ChatMol:
                 print("No response received.")
             return None
 
+    async def achatlite(self, question):
+        answer = await self.aquery_qaserver(question)
+        if answer is None and self.verbose:
+            print("No response received.")
+        return answer
+
     def chat_with_gpt(self, message):
         self.chatgpt_conversation_history.append(
             {"role": "user", "content": message}
         )
 
         try:
-            messages = [
-                {"role": "system", "content": self.chatgpt_sys_prompt},
-            ]            
-            for message in self.chatgpt_conversation_history[-self.chatgpt_max_history:]:
-                messages.append(message)
-            response = self.client.chat.completions.create(
-                model=self.gpt_model,
-                messages=messages,
-                max_tokens=self.chatgpt_max_tokens,
-                n=1,
-                temperature=self.chatgpt_temp,
-            )
-            answer = response.choices[0].message.content.strip()
-
-            self.chatgpt_conversation_history.append(
-                {"role": "assistant", "content": answer}
-            )
+            response = self.client.chat.completions.create(**self._gpt_request())
+            return self._gpt_answer(response)
+        except Exception as e:
+            print(f"Error: {e}")
+            return ""
 
-            return answer
+    async def achat_with_gpt(self, message):
+        self.init_async_clients()
+        self.chatgpt_conversation_history.append(
+            {"role": "user", "content": message}
+        )
+        try:
+            async with self._async["limits"]["openai"]:
+                response = await self._async["openai"].chat.completions.create(**self._gpt_request())
+            return self._gpt_answer(response)
         except Exception as e:
             print(f"Error: {e}")
             return ""
+
+    def _gpt_request(self):
+        messages = [
+            {"role": "system", "content": self.chatgpt_sys_prompt},
+        ]
+        for message in self.chatgpt_conversation_history[-self.chatgpt_max_history:]:
+            messages.append(message)
+        return dict(
+            model=self.gpt_model,
+            messages=messages,
+            max_tokens=self.chatgpt_max_tokens,
+            n=1,
+            temperature=self.chatgpt_temp,
+        )
+
+    def _gpt_answer(self, response):
+        answer = response.choices[0].message.content.strip()
+        self.chatgpt_conversation_history.append(
+            {"role": "assistant", "content": answer}
+        )
+        return answer
         
     def chat_with_chatmol_llm(self, message):
         self.chatmol_llm_conversation_history.append(
             {"role": "user", "content": message}
         )
         try:
-            messages = self.chatmol_llm_conversation_history
-            if len(messages) > self.chatgpt_max_history:
-                messages.pop(0)
-                messages.pop(0)
-            messages = [{'role': 'system', 'content': self.chatmol_llm_prompt_dict["v1"]}] + messages
-            response = self.client_chatmol.chat.completions.create(
-                model="test",
-                messages=messages,
-                max_tokens=self.chatgpt_max_tokens,
-                n=1,
-                temperature=0,
-            )
-            answer = response.choices[0].message.content.strip()
+            response = self.client_chatmol.chat.completions.create(**self._chatmol_llm_request())
+            return self._chatmol_llm_answer(response)
+        except Exception as e:
+            print(f"Error: {e}")
+            return ""
 
-            self.chatmol_llm_conversation_history.append(
-                {"role": "assistant", "content": answer}
-            )
-            return answer
+    async def achat_with_chatmol_llm(self, message):
+        self.init_async_clients()
+        self.chatmol_llm_conversation_history.append(
+            {"role": "user", "content": message}
+        )
+        try:
+            async with self._async["limits"]["chatmol"]:
+                response = await self._async["chatmol"].chat.completions.create(**self._chatmol_llm_request())
+            return self._chatmol_llm_answer(response)
         except Exception as e:
             print(f"Error: {e}")
             return ""
 
+    def _chatmol_llm_request(self):
+        messages = self.chatmol_llm_conversation_history
+        if len(messages) > self.chatgpt_max_history:
+            messages.pop(0)
+            messages.pop(0)
+        messages = [{'role': 'system', 'content': self.chatmol_llm_prompt_dict["v1"]}] + messages
+        return dict(
+            model="test",
+            messages=messages,
+            max_tokens=self.chatgpt_max_tokens,
+            n=1,
+            temperature=0,
+        )
+
+    def _chatmol_llm_answer(self, response):
+        answer = response.choices[0].message.content.strip()
+        self.chatmol_llm_conversation_history.append(
+            {"role": "assistant", "content": answer}
+        )
+        return answer
+
     def chat_with_claude(self, message):
         try:
             self.claude_conversation_messages.append({"role": "user", "content": message})
-            messages = []
-            for message in self.claude_conversation_messages[-self.chatgpt_max_history:]:
-                messages.append(message)
-            response = self.client_anthropic.messages.create(
-                model=self.claude_model,
-                system=self.chatgpt_sys_prompt,
-                max_tokens=self.chatgpt_max_tokens,
-                messages=messages,
-                temperature=self.chatgpt_temp
-            )
-            answer = response.content[0].text
-            if self.verbose:
-                print(f"Answers from Claude: {answer}")
-            self.claude_conversation_messages.append({"role": "assistant", "content": answer})
-            return answer
+            response = self.client_anthropic.messages.create(**self._claude_request())
+            return self._claude_answer(response)
         except Exception as e:
             print(f"Error: {e}")
             return ""
 
+    async def achat_with_claude(self, message):
+        self.init_async_clients()
+        try:
+            self.claude_conversation_messages.append({"role": "user", "content": message})
+            async with self._async["limits"]["anthropic"]:
+                response = await self._async["anthropic"].messages.create(**self._claude_request())
+            return self._claude_answer(response)
+        except Exception as e:
+            print(f"Error: {e}")
+            return ""
+
+    def _claude_request(self):
+        messages = []
+        for message in self.claude_conversation_messages[-self.chatgpt_max_history:]:
+            messages.append(message)
+        return dict(
+            model=self.claude_model,
+            system=self.chatgpt_sys_prompt,
+            max_tokens=self.chatgpt_max_tokens,
+            messages=messages,
+            temperature=self.chatgpt_temp
+        )
+
+    def _claude_answer(self, response):
+        answer = response.content[0].text
+        if self.verbose:
+            print(f"Answers from Claude: {answer}")
+        self.claude_conversation_messages.append({"role": "assistant", "content": answer})
+        return answer
+
+    def new_session(self):
+        """
+        Returns a ChatMol that shares this instance's API clients and settings
+        but has its own conversation histories and stashed commands.
+        """
+        session = copy.copy(self)
+        session._owns_async = False
+        session.import_state({})
+        return session
+
+    def export_state(self):
+        """Returns a JSON-serializable copy of the per-session state."""
+        return {
+            name: copy.deepcopy(getattr(self, name, empty))
+            for name, empty in self.SESSION_STATE.items()
+        }
+
+    def import_state(self, state):
+        """Replaces the per-session state; missing entries are reset."""
+        for name, empty in self.SESSION_STATE.items():
+            setattr(self, name, copy.deepcopy(state.get(name, empty)))
+
     def clear_stashed_commands(self):
         self.stashed_commands = []
 
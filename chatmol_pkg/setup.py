@@ -6,6 +6,7 @@ setup(
     packages=find_packages(),
     install_requires=[
         'requests', 
+        'httpx',
         'openai>=1.3.9',
         'anthropic>=0.19.1',
         'streamlit>=1.35.0'
@@ -66,9 +66,13 @@ def send_response_to_server():
     if (index):
        command = conversation[index+9:]
        print("command", command)
-    response = requests.post('http://localhost:8101/send_message', data=command)
+    commands = [line for line in command.split('\n') if line.strip()]
+    response = requests.post('http://localhost:8101/batch', json=commands)
     if response.status_code == 200:
         print('Command sent to server successfully.')
+        for result in response.json()['results']:
+            if not result['ok']:
+                print(f"Command failed: {result['command']} ({result['error']})")
     else:
         print(f'Failed to send command to server. Status code: {response.status_code}')
 
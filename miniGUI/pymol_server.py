@@ -1,17 +1,121 @@
 import http.server
 from http import HTTPStatus
 from pymol import cmd
+from typing import Dict, List, Optional, Union
 import urllib.parse
 import threading
 import requests
+import queue
+import json
+import time
+
+# Same classes as in the repository's chatmol.py, which ships as a single
+# file; keep the two copies in sync.
+class PyMOLCommandQueue:
+    """Bounded queue of command batches, executed one batch at a time.
+
+    HTTP request threads submit batches and wait for their results; the
+    queue is drained on PyMOL's main (Qt) thread when one is available, or
+    on a single dedicated thread otherwise, so cmd.do is never called
+    concurrently from the request threads.
+    """
+
+    def __init__(self, maxsize: int = 32, drain_interval_ms: int = 20):
+        self.jobs = queue.Queue(maxsize=maxsize)
+        self.drain_interval_ms = drain_interval_ms
+        self._timer = None
+        self._thread = None
+
+    def submit(self, commands: List[str], block: bool = False) -> Dict:
+        """Queue a batch of commands; raises queue.Full when saturated."""
+        job = {"commands": commands, "results": None, "done": threading.Event()}
+        self.jobs.put(job, block=block)
+        return job
+
+    def drain(self) -> None:
+        """Execute every queued batch. Must run on the executing thread."""
+        while True:
+            try:
+                job = self.jobs.get_nowait()
+            except queue.Empty:
+                return
+            self.run_job(job)
+
+    def run_job(self, job: Dict) -> None:
+        job["results"] = [self.run_command(command) for command in job["commands"]]
+        job["done"].set()
+
+    @staticmethod
+    def run_command(command: str) -> Dict[str, Union[str, bool, float]]:
+        start = time.perf_counter()
+        try:
+            cmd.do(command)
+            ok, error = True, ""
+        except Exception as e:
+            ok, error = False, str(e)
+        return {
+            "command": command,
+            "ok": ok,
+            "error": error,
+            "elapsed_ms": round((time.perf_counter() - start) * 1000, 3),
+        }
+
+    def start(self) -> None:
+        """Start draining on the Qt main thread, falling back to a worker thread."""
+        if self._timer is not None or self._thread is not None:
+            return
+        if threading.current_thread() is threading.main_thread():
+            try:
+                from pymol.Qt import QtCore, QtWidgets
+
+                if QtWidgets.QApplication.instance() is not None:
+                    self._timer = QtCore.QTimer()
+                    self._timer.timeout.connect(self.drain)
+                    self._timer.start(self.drain_interval_ms)
+                    return
+            except ImportError:
+                pass
+        self._thread = threading.Thread(target=self._drain_forever, daemon=True)
+        self._thread.start()
+
+    def _drain_forever(self) -> None:
+        while True:
+            self.run_job(self.jobs.get())
+
 
 class PyMOLCommandHandler(http.server.BaseHTTPRequestHandler):
+    command_queue: PyMOLCommandQueue = None
+    result_timeout = 120
+
     def _send_cors_headers(self):
         """Sets headers required for CORS"""
         self.send_header("Access-Control-Allow-Origin", "*")
         self.send_header("Access-Control-Allow-Methods", "GET,POST,OPTIONS")
         self.send_header("Access-Control-Allow-Headers", "x-api-key,Content-Type")
 
+    def _send_body(self, status, body: bytes, content_type: str = "text/plain"):
+        self.send_response(status)
+        self._send_cors_headers()
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _run_commands(self, commands: List[str]) -> Optional[List[Dict]]:
+        """Queue commands for the main thread and wait for their results.
+
+        Sends the error response itself and returns None on failure.
+        """
+        try:
+            job = self.command_queue.submit(commands)
+        except queue.Full:
+            self._send_body(HTTPStatus.TOO_MANY_REQUESTS, b"Command queue is full, retry later")
+            return None
+        if not job["done"].wait(self.result_timeout):
+            self._send_body(HTTPStatus.GATEWAY_TIMEOUT, b"Timed out waiting for PyMOL")
+            return None
+        return job["results"]
+
     def do_OPTIONS(self):
         """Respond to a OPTIONS request."""
         self.send_response(HTTPStatus.NO_CONTENT)
@@ -19,39 +123,56 @@ class PyMOLCommandHandler(http.server.BaseHTTPRequestHandler):
         self.end_headers()
 
     def do_POST(self):
-        if self.path != "/send_message":
+        if self.path not in ("/send_message", "/batch"):
             self.send_response(HTTPStatus.NOT_FOUND)
             self.end_headers()
             return
 
-        content_length = int(self.headers['Content-Length'])
+        content_length = int(self.headers["Content-Length"])
         post_data = self.rfile.read(content_length)
+
+        if self.path == "/batch":
+            try:
+                commands = json.loads(post_data.decode())
+                if isinstance(commands, dict):
+                    commands = commands.get("commands")
+                if not isinstance(commands, list) or not all(
+                    isinstance(c, str) for c in commands
+                ):
+                    raise ValueError("expected a JSON array of command strings")
+            except ValueError as e:
+                self._send_body(HTTPStatus.BAD_REQUEST, str(e).encode())
+                return
+            results = self._run_commands(commands)
+            if results is None:
+                return
+            body = {"ok": all(r["ok"] for r in results), "results": results}
+            self._send_body(HTTPStatus.OK, json.dumps(body).encode(), "application/json")
+            return
+
         post_data = urllib.parse.unquote(post_data.decode())
-        
-        try:
-            cmd.do(post_data)
-            self.send_response(HTTPStatus.OK)
-            self._send_cors_headers()
-            self.end_headers()
-            self.wfile.write(b'Command executed')
-        except Exception as e:
-            self.send_response(HTTPStatus.INTERNAL_SERVER_ERROR)
-            self.end_headers()
-            self.wfile.write(str(e).encode())
-    
+        results = self._run_commands([post_data])
+        if results is None:
+            return
+        if results[0]["ok"]:
+            self._send_body(HTTPStatus.OK, b"Command executed")
+        else:
+            self._send_body(HTTPStatus.INTERNAL_SERVER_ERROR, results[0]["error"].encode())
+
     def do_GET(self):
         if self.path == "/":
             self.send_response(HTTPStatus.OK)
             self._send_cors_headers()
             self.send_header("Content-Type", "text/html")
             self.end_headers()
-            self.wfile.write(b'Hello, this is the local Pymol server.')
+            self.wfile.write(b"Hello, this is the local Pymol server.")
             return
         self.send_response(HTTPStatus.NOT_FOUND)
         self.end_headers()
 
 def start_server():
-    httpd = http.server.HTTPServer(('localhost', 8101), PyMOLCommandHandler)
+    httpd = http.server.ThreadingHTTPServer(('localhost', 8101), PyMOLCommandHandler)
+    httpd.daemon_threads = True
     httpd.serve_forever()
 
 def is_http_server_running():
@@ -63,6 +184,8 @@ def is_http_server_running():
         return False
 
 if not is_http_server_running():
+    PyMOLCommandHandler.command_queue = PyMOLCommandQueue()
+    PyMOLCommandHandler.command_queue.start()
     server_thread = threading.Thread(target=start_server)
     server_thread.start()
     print("Server started")
@@ -0,0 +1,105 @@
+"""
+Tiled vs single-process ray tracing benchmark for the ChatMol v2 plugin.
+
+Builds a scene (a structure file, or a synthetic peptide with a surface),
+then renders it through the plugin's RenderQueue once in a single headless
+PyMOL and once split into bands across parallel PyMOL processes. Reports
+the wall-clock time of each path and checks that the stitched image matches
+the single-process one in size and layout.
+
+Usage:
+    python benchmarks/tiled_render.py [--structure 1pga.pdb] [--width 2400]
+        [--height 1800] [--dpi 300] [--tiles 0] [--runs 1]
+"""
+import argparse
+import importlib.util
+import os
+import sys
+import tempfile
+import time
+
+PLUGIN_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "chatmol.py")
+
+def load_plugin():
+    """Imports the plugin; its agent is only created when a chat command runs."""
+    # Own module name, so it cannot clash with an installed chatmol package
+    spec = importlib.util.spec_from_file_location("chatmol_plugin", PLUGIN_PATH)
+    plugin = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(plugin)
+    return plugin
+
+def build_scene(cmd, structure=None):
+    cmd.reinitialize()
+    if structure:
+        cmd.load(structure)
+    else:
+        cmd.fab("ACDEFGHIKLMNPQRSTVWY" * 3, "peptide", ss=1)
+    cmd.hide("everything")
+    cmd.show("cartoon")
+    cmd.show("surface")
+    cmd.set("transparency", 0.3)
+    cmd.bg_color("white")
+    cmd.set("bg_gradient", 0)  # gradients are never tiled
+    cmd.set("ray_opaque_background", 1)
+    cmd.set("orthoscopic", 1)
+    cmd.orient()
+
+def render(queue, path, args, tiles):
+    start = time.perf_counter()
+    job = queue.submit(path, args.width, args.height, args.dpi, 1, None, tiles=tiles)
+    job["done"].wait()
+    if job["error"]:
+        raise RuntimeError(job["error"])
+    return time.perf_counter() - start, job["tiles"]
+
+def compare(single_path, tiled_path):
+    """Returns (same size, fraction of pixels off by more than 8 levels) or None without PIL."""
+    try:
+        from PIL import Image, ImageChops
+    except ImportError:
+        return None
+    with Image.open(single_path) as a, Image.open(tiled_path) as b:
+        if a.size != b.size:
+            return False, 1.0
+        diff = ImageChops.difference(a.convert("RGB"), b.convert("RGB")).convert("L")
+        histogram = diff.histogram()
+        return True, sum(histogram[9:]) / float(a.size[0] * a.size[1])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--structure", default=None)
+    parser.add_argument("--width", type=int, default=2400)
+    parser.add_argument("--height", type=int, default=1800)
+    parser.add_argument("--dpi", type=int, default=300)
+    parser.add_argument("--tiles", type=int, default=0, help="0 = one per CPU core")
+    parser.add_argument("--runs", type=int, default=1)
+    args = parser.parse_args()
+
+    plugin = load_plugin()
+    build_scene(plugin.cmd, args.structure)
+    tiles = args.tiles or (os.cpu_count() or 1)
+    queue = plugin.RenderQueue(max_concurrent=1)
+    out_dir = tempfile.mkdtemp(prefix="chatmol_tiled_bench_")
+    single_path = os.path.join(out_dir, "single.png")
+    tiled_path = os.path.join(out_dir, "tiled.png")
+
+    single = min(render(queue, single_path, args, 1)[0] for _ in range(args.runs))
+    tiled_runs = [render(queue, tiled_path, args, tiles) for _ in range(args.runs)]
+    tiled = min(t for t, _ in tiled_runs)
+    used = tiled_runs[0][1]
+
+    print(f"{args.width}x{args.height} at {args.dpi} dpi, {os.cpu_count()} CPUs, best of {args.runs}")
+    print(f"  single process: {single:.1f} s")
+    print(f"  {used} tiles:        {tiled:.1f} s ({single / tiled:.2f}x)")
+    if used == 1:
+        print("  note: scene was not tiled (perspective view, bg_gradient, too few rows, or no PIL/Qt)")
+    match = compare(single_path, tiled_path)
+    if match is None:
+        print("  layout check skipped: PIL not installed")
+        return 0
+    same_size, off = match
+    print(f"  layout: {'same size' if same_size else 'SIZE MISMATCH'}, {off:.3%} pixels differ")
+    return 0 if same_size and off < 0.01 else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -14,14 +14,21 @@ EN: Chain A of 3WZM is a cocrystal complex of zearalenone hydrolase and its subs
 
 import os
 import json
+import math
 import re
+import sys
 import time
 import random
 import base64
+import hashlib
+import shutil
 import tempfile
 import threading
+import subprocess
 import requests
 
+from collections import Counter, OrderedDict
+from concurrent.futures import CancelledError, Future
 from datetime import datetime
 from pymol import cmd, util, preset
 
@@ -95,6 +102,63 @@ PROVIDERS = {
 }
 
 
+# One pooled requests.Session per provider endpoint, shared by every
+# LLMClient so keep-alive connections survive client re-creation.
+_HTTP_SESSIONS = {}
+_HTTP_STATS = {}
+_HTTP_LOCK = threading.Lock()
+
+
+def _http_session(base_url):
+    with _HTTP_LOCK:
+        session = _HTTP_SESSIONS.get(base_url)
+        if session is None:
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(
+                pool_connections=1, pool_maxsize=4, max_retries=0
+            )
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _HTTP_SESSIONS[base_url] = session
+            _HTTP_STATS[base_url] = {"requests": 0}
+        return session
+
+
+def _count_request(base_url):
+    with _HTTP_LOCK:
+        _HTTP_STATS[base_url]["requests"] += 1
+
+
+def prewarm_connection(base_url):
+    """Open a keep-alive connection to base_url in the background."""
+
+    def _connect():
+        try:
+            session = _http_session(base_url)
+            _count_request(base_url)
+            session.head(base_url, timeout=10).close()
+        except requests.RequestException:
+            pass
+
+    threading.Thread(target=_connect, daemon=True).start()
+
+
+def connection_stats(base_url):
+    """Requests sent and TCP/TLS connections opened for base_url."""
+    session = _HTTP_SESSIONS.get(base_url)
+    if session is None:
+        return {"requests": 0, "connections": 0, "reused": 0}
+    adapter = session.get_adapter(base_url)
+    pools = adapter.poolmanager.pools
+    connections = sum(pools[key].num_connections for key in pools.keys())
+    requests_sent = _HTTP_STATS[base_url]["requests"]
+    return {
+        "requests": requests_sent,
+        "connections": connections,
+        "reused": max(0, requests_sent - connections),
+    }
+
+
 class LLMTransientError(RuntimeError):
     """Transient API/network errors that should be retried."""
 
@@ -111,6 +175,7 @@ class LLMClient:
         self.base_url = prov["base_url"]
         self.extra_headers = prov.get("extra_headers", {})
         self.api_key = api_key
+        self.session = _http_session(self.base_url)
 
     def _headers(self):
         h = {
@@ -163,7 +228,8 @@ class LLMClient:
         if tools:
             payload["tools"] = tools
         try:
-            resp = requests.post(
+            _count_request(self.base_url)
+            resp = self.session.post(
                 self.base_url, headers=self._headers(), json=payload, timeout=120
             )
         except requests.ConnectionError:
@@ -175,7 +241,140 @@ class LLMClient:
         self._parse_choices(data)  # validate structure
         return data
 
-    def vision_completion(self, model, text_prompt, image_base64):
+    def chat_completion_stream(
+        self,
+        model,
+        messages,
+        tools=None,
+        temperature=0.01,
+        max_tokens=4096,
+        on_text=None,
+        on_tool_call=None,
+    ):
+        """Streaming chat_completion over server-sent events.
+
+        on_text(delta) is called for each content fragment and
+        on_tool_call(tool_call) as soon as a tool call's arguments are
+        complete. Returns the assembled response in the same shape as
+        chat_completion.
+        """
+        payload = {
+            "model": model,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            "stream": True,
+            "stream_options": {"include_usage": True},
+        }
+        if tools:
+            payload["tools"] = tools
+        try:
+            _count_request(self.base_url)
+            resp = self.session.post(
+                self.base_url,
+                headers=self._headers(),
+                json=payload,
+                stream=True,
+                timeout=(10, 120),
+            )
+        except requests.ConnectionError:
+            raise LLMTransientError(f"Connection failed: cannot reach {self.base_url}")
+        except requests.Timeout:
+            raise LLMTransientError(f"Request timed out after 120s to {self.base_url}")
+        with resp:
+            self._check_response(resp)
+            if "text/event-stream" not in resp.headers.get("Content-Type", ""):
+                # Provider ignored "stream": plain JSON body
+                data = resp.json()
+                self._parse_choices(data)
+                return data
+            try:
+                return self._read_event_stream(resp, on_text, on_tool_call)
+            except requests.Timeout:
+                raise LLMTransientError(
+                    f"Stream stalled for 120s from {self.base_url}"
+                )
+            except (requests.ConnectionError, requests.exceptions.ChunkedEncodingError):
+                raise LLMTransientError(f"Stream interrupted from {self.base_url}")
+
+    def _read_event_stream(self, resp, on_text=None, on_tool_call=None):
+        content = []
+        calls = {}  # index -> tool call being assembled
+        closed = set()
+        data = {}
+        finish_reason = None
+
+        def _close(index):
+            call = calls[index]
+            if index in closed or not call["id"] or not call["function"]["name"]:
+                return
+            closed.add(index)
+            if on_tool_call:
+                on_tool_call(call)
+
+        for line in resp.iter_lines(decode_unicode=True):
+            # Skip keep-alives and comments such as ": OPENROUTER PROCESSING"
+            if not line or not line.startswith("data:"):
+                continue
+            chunk = line[5:].strip()
+            if chunk == "[DONE]":
+                break
+            try:
+                event = json.loads(chunk)
+            except json.JSONDecodeError:
+                continue
+            if "error" in event:
+                self._parse_choices(event)  # raises LLMFatalError
+            for key in ("id", "model"):
+                if event.get(key):
+                    data.setdefault(key, event[key])
+            if event.get("usage"):
+                data["usage"] = event["usage"]
+            for choice in event.get("choices") or []:
+                delta = choice.get("delta") or {}
+                text = delta.get("content")
+                if text:
+                    content.append(text)
+                    if on_text:
+                        on_text(text)
+                for tc in delta.get("tool_calls") or []:
+                    index = tc.get("index", len(calls))
+                    if index not in calls:
+                        # A new call starts: earlier ones are complete
+                        for prev in list(calls):
+                            _close(prev)
+                        calls[index] = {
+                            "id": "",
+                            "type": "function",
+                            "function": {"name": "", "arguments": ""},
+                        }
+                    call = calls[index]
+                    call["id"] = tc.get("id") or call["id"]
+                    fn = tc.get("function") or {}
+                    name = fn.get("name")
+                    if name and name != call["function"]["name"]:
+                        call["function"]["name"] += name
+                    call["function"]["arguments"] += fn.get("arguments") or ""
+                    if _is_complete_json_object(call["function"]["arguments"]):
+                        _close(index)
+                if choice.get("finish_reason"):
+                    finish_reason = choice["finish_reason"]
+
+        if not content and not calls and finish_reason is None:
+            raise LLMTransientError(
+                f"Stream from {self.base_url} ended without a response."
+            )
+        for index in list(calls):
+            _close(index)
+        message = {"role": "assistant", "content": "".join(content) or None}
+        if calls:
+            message["tool_calls"] = [calls[i] for i in sorted(calls)]
+        data["choices"] = [
+            {"index": 0, "message": message, "finish_reason": finish_reason}
+        ]
+        return data
+
+    def vision_completion(self, model, text_prompt, image_base64, mime="image/png"):
         messages = [
             {
                 "role": "user",
@@ -183,7 +382,7 @@ class LLMClient:
                     {"type": "text", "text": text_prompt},
                     {
                         "type": "image_url",
-                        "image_url": {"url": f"data:image/png;base64,{image_base64}"},
+                        "image_url": {"url": f"data:{mime};base64,{image_base64}"},
                     },
                 ],
             }
@@ -194,7 +393,8 @@ class LLMClient:
             "max_tokens": 1024,
         }
         try:
-            resp = requests.post(
+            _count_request(self.base_url)
+            resp = self.session.post(
                 self.base_url, headers=self._headers(), json=payload, timeout=120
             )
         except requests.ConnectionError:
@@ -207,6 +407,16 @@ class LLMClient:
         return choice["message"]["content"]
 
 
+def _is_complete_json_object(text):
+    text = text.strip()
+    if not text.endswith("}"):
+        return False
+    try:
+        return isinstance(json.loads(text), dict)
+    except json.JSONDecodeError:
+        return False
+
+
 # ---------------------------------------------------------------------------
 # 2. PyMOLTools — 4 tool definitions + execution
 # ---------------------------------------------------------------------------
@@ -226,6 +436,15 @@ BLOCKED_COMMANDS = [
         ),
     ),
 ]
+# All blocked patterns as one alternation; the matching group names the rule
+_BLOCKED_PATTERN = re.compile(
+    "|".join(
+        f"(?P<rule{i}>{pattern.pattern})"
+        for i, (_, pattern) in enumerate(BLOCKED_COMMANDS)
+    ),
+    re.I,
+)
+_DELETE_PATTERN = re.compile(r"^\s*delete\s+([A-Za-z0-9_]+)\s*$", re.I)
 
 TOOL_DEFINITIONS = [
     {
@@ -243,7 +462,15 @@ TOOL_DEFINITIONS = [
                         "type": "boolean",
                         "description": "Include camera view matrix.",
                         "default": False,
-                    }
+                    },
+                    "diff_since": {
+                        "type": "integer",
+                        "description": (
+                            "Revision from an earlier inspect_session result. "
+                            "Only objects and selections that changed since "
+                            "then are returned."
+                        ),
+                    },
                 },
             },
         },
@@ -300,11 +527,38 @@ TOOL_DEFINITIONS = [
                         "description": "If omitted: preview=False, final=True.",
                     },
                     "transparent_bg": {"type": "boolean", "default": True},
+                    "background": {
+                        "type": "boolean",
+                        "description": (
+                            "Ray trace in a background process and return "
+                            "immediately with a job_id. If omitted: "
+                            "final=True, preview=False."
+                        ),
+                    },
                 },
                 "required": ["path"],
             },
         },
     },
+    {
+        "type": "function",
+        "function": {
+            "name": "render_status",
+            "description": (
+                "Progress of background renders: queued, running, done or "
+                "failed, with elapsed time."
+            ),
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "job_id": {
+                        "type": "integer",
+                        "description": "Job to report; omit for all jobs.",
+                    }
+                },
+            },
+        },
+    },
     {
         "type": "function",
         "function": {
@@ -339,18 +593,21 @@ def _to_bool(value, default=False):
 
 
 def _blocked_reason(line):
-    for reason, pattern in BLOCKED_COMMANDS:
-        if pattern.search(line):
-            return reason
-    return ""
+    match = _BLOCKED_PATTERN.search(line)
+    if not match:
+        return ""
+    return BLOCKED_COMMANDS[int(match.lastgroup[len("rule"):])][0]
 
 
-def execute_tool(tool_name, arguments, client=None, vision_model=None):
+def execute_tool(
+    tool_name, arguments, client=None, vision_model=None, vision_options=None
+):
     """Dispatch to a tool implementation and always return JSON text."""
     dispatch = {
         "inspect_session": _tool_inspect_session,
         "run_pymol_commands": _tool_run_pymol_commands,
         "render": _tool_render,
+        "render_status": _tool_render_status,
         "capture_viewport": _tool_capture_viewport,
     }
     fn = dispatch.get(tool_name)
@@ -361,7 +618,12 @@ def execute_tool(tool_name, arguments, client=None, vision_model=None):
         )
     try:
         if tool_name == "capture_viewport":
-            result = fn(client=client, vision_model=vision_model, **(arguments or {}))
+            result = fn(
+                client=client,
+                vision_model=vision_model,
+                vision_options=vision_options,
+                **(arguments or {}),
+            )
         else:
             result = fn(**(arguments or {}))
     except TypeError as exc:
@@ -371,29 +633,136 @@ def execute_tool(tool_name, arguments, client=None, vision_model=None):
     return json.dumps(result, ensure_ascii=False)
 
 
-def _tool_inspect_session(include_view=False):
-    objects = cmd.get_names("objects")
-    selections = cmd.get_names("selections")
-    details = []
-    for obj in objects:
-        details.append(
-            {
+# PyMOL's automatic "polymer" classification bit in AtomInfo flags
+_POLYMER_FLAG = 0x08000000
+
+
+class SessionSnapshot:
+    """Per-object summary of the PyMOL session, rebuilt only on change.
+
+    All atom-level counts come from a single iterate pass instead of several
+    selections per object. The result is cached until the change key moves:
+    object/selection names, total atom and state counts, and a generation
+    counter that tools bump after running commands. Recent snapshots are
+    kept by revision so callers can ask for a diff.
+    """
+
+    MAX_KEPT = 8
+
+    def __init__(self):
+        self.generation = 0
+        self.revision = 0
+        self._key = None
+        self._snapshots = {}  # revision -> (objects by name, selections)
+
+    def touch(self):
+        """Mark the session as changed."""
+        self.generation += 1
+
+    def _change_key(self):
+        return (
+            self.generation,
+            tuple(cmd.get_names("all")),
+            cmd.count_atoms("all"),
+            cmd.count_states("all"),
+        )
+
+    def _collect(self):
+        objects = {}
+        for obj in cmd.get_names("objects"):
+            objects[obj] = {
                 "name": obj,
-                "atoms": cmd.count_atoms(obj),
-                "polymer_atoms": cmd.count_atoms(f"({obj}) and polymer"),
-                "hetatm_atoms": cmd.count_atoms(f"({obj}) and hetatm"),
-                "chains": cmd.get_chains(obj),
+                "atoms": 0,
+                "polymer_atoms": 0,
+                "hetatm_atoms": 0,
+                "chains": [],
                 "states": cmd.count_states(obj),
             }
+        counts = Counter()
+        cmd.iterate(
+            "all",
+            "counts[model, chain, type == 'HETATM', flags & polymer_flag] += 1",
+            space={"counts": counts, "polymer_flag": _POLYMER_FLAG},
+        )
+        for (model, chain, hetatm, polymer), n in counts.items():
+            entry = objects.get(model)
+            if entry is None:
+                continue
+            entry["atoms"] += n
+            if hetatm:
+                entry["hetatm_atoms"] += n
+            if polymer:
+                entry["polymer_atoms"] += n
+            if chain not in entry["chains"]:
+                entry["chains"].append(chain)
+        for entry in objects.values():
+            entry["chains"].sort()
+        return objects, cmd.get_names("selections")
+
+    def current(self):
+        """Return (revision, objects, selections), rebuilding if needed."""
+        key = self._change_key()
+        if key != self._key or self.revision not in self._snapshots:
+            objects, selections = self._collect()
+            previous = self._snapshots.get(self.revision)
+            if previous is None or previous != (objects, selections):
+                self.revision += 1
+                self._snapshots[self.revision] = (objects, selections)
+                for old in sorted(self._snapshots)[: -self.MAX_KEPT]:
+                    del self._snapshots[old]
+            self._key = key
+        objects, selections = self._snapshots[self.revision]
+        return self.revision, objects, selections
+
+    def diff(self, since):
+        """Changes between revision `since` and now, or None if unknown."""
+        revision, objects, selections = self.current()
+        base = self._snapshots.get(since)
+        if base is None:
+            return None
+        old_objects, old_selections = base
+        return {
+            "revision": revision,
+            "diff_since": since,
+            "unchanged": revision == since,
+            "added": [o for name, o in objects.items() if name not in old_objects],
+            "removed": [name for name in old_objects if name not in objects],
+            "changed": [
+                o
+                for name, o in objects.items()
+                if name in old_objects and old_objects[name] != o
+            ],
+            "selections_added": [x for x in selections if x not in old_selections],
+            "selections_removed": [x for x in old_selections if x not in selections],
+        }
+
+
+_session_snapshot = SessionSnapshot()
+
+
+def _tool_inspect_session(include_view=False, diff_since=None):
+    out = {"ok": True, "tool": "inspect_session"}
+    diff = None
+    if diff_since is not None:
+        try:
+            diff = _session_snapshot.diff(int(diff_since))
+        except (TypeError, ValueError):
+            diff = None
+        if diff is None:
+            out["note"] = "diff_since revision unavailable; full snapshot returned."
+    if diff is not None:
+        out.update(diff)
+    else:
+        revision, objects, selections = _session_snapshot.current()
+        out.update(
+            {
+                "revision": revision,
+                "object_count": len(objects),
+                "selection_count": len(selections),
+                "objects": list(objects.values()),
+                "selections": list(selections),
+            }
         )
-    out = {
-        "ok": True,
-        "tool": "inspect_session",
-        "object_count": len(objects),
-        "selection_count": len(selections),
-        "objects": details,
-        "selections": selections,
-    }
     if _to_bool(include_view):
         out["view"] = list(cmd.get_view())
     return out
@@ -405,25 +774,43 @@ def _tool_run_pymol_commands(commands):
         for ln in commands.splitlines()
         if ln.strip() and not ln.strip().startswith("#")
     ]
-    executed, blocked, errors = [], [], []
-    known_names = set(cmd.get_names("all"))
+    executed, blocked, errors, timings = [], [], [], []
+    runnable = []
     for line in lines:
         reason = _blocked_reason(line)
         if reason:
             blocked.append({"command": line, "reason": reason})
-            continue
-        m_del = re.match(r"^\s*delete\s+([A-Za-z0-9_]+)\s*$", line, re.I)
-        if m_del:
-            target = m_del.group(1)
-            if target not in known_names:
-                continue  # skip silently
-        try:
-            cmd.do(line)
-            executed.append(line)
+        else:
+            runnable.append(line)
+
+    known_names = set(cmd.get_names("all"))
+    batch_start = time.perf_counter()
+    # Like cmd.do with a list: hold redraws until the whole batch has run
+    defer = cmd.get_setting_int("defer_updates")
+    if len(runnable) > 1:
+        cmd.set("defer_updates", 1)
+    try:
+        for line in runnable:
+            m_del = _DELETE_PATTERN.match(line)
             if m_del:
-                known_names.discard(m_del.group(1))
-        except Exception as exc:
-            errors.append({"command": line, "error": str(exc)})
+                target = m_del.group(1)
+                if target not in known_names:
+                    continue  # skip silently
+            start = time.perf_counter()
+            try:
+                cmd.do(line)
+                executed.append(line)
+                timings.append(round((time.perf_counter() - start) * 1000, 1))
+                if m_del:
+                    known_names.discard(m_del.group(1))
+            except Exception as exc:
+                errors.append({"command": line, "error": str(exc)})
+    finally:
+        if len(runnable) > 1:
+            cmd.set("defer_updates", defer)
+    if executed or errors:
+        cmd.refresh()
+        _session_snapshot.touch()
     return {
         "ok": not blocked and not errors,
         "tool": "run_pymol_commands",
@@ -431,11 +818,346 @@ def _tool_run_pymol_commands(commands):
         "blocked_count": len(blocked),
         "error_count": len(errors),
         "executed": executed,
+        "timings_ms": timings,
+        "elapsed_ms": round((time.perf_counter() - batch_start) * 1000, 1),
         "blocked": blocked,
         "errors": errors,
     }
 
 
+RENDER_CACHE_DIR = os.path.expanduser("~/.PyMOL/chatmol_render_cache")
+RENDER_CACHE_SIZE = 50
+# Settings that change without affecting the image (e.g. on cmd.save)
+_NON_VISUAL_SETTINGS = ("session_file", "session_changed")
+# Tiled ray tracing: rows rendered past each band edge (cropped when
+# stitching) and the smallest band worth a separate process
+RENDER_TILE_MARGIN = 8
+RENDER_TILE_MIN_HEIGHT = 64
+
+
+def _scene_hash(params):
+    """Hash of everything that affects a rendered image.
+
+    Covers the view matrix, object names and states, per-atom colours and
+    representations, coordinates, global and object-level settings, and
+    the render parameters.
+    """
+    h = hashlib.sha1()
+
+    def _add(value):
+        h.update(repr(value).encode("utf-8"))
+        h.update(b"\0")
+
+    _add(sorted(params.items()))
+    _add(cmd.get_view())
+    names = cmd.get_names("all", enabled_only=1)
+    _add(names)
+    for name in cmd.get_names("objects", enabled_only=1):
+        _add((name, cmd.get_object_state(name) if hasattr(cmd, "get_object_state") else 0))
+        if hasattr(cmd, "get_object_settings"):
+            _add(cmd.get_object_settings(name))
+    _add(cmd.get_state())
+    appearance = Counter()
+    cmd.iterate(
+        "enabled",
+        "appearance[model, color, reps, label, ss] += 1",
+        space={"appearance": appearance},
+    )
+    _add(sorted(appearance.items()))
+    try:
+        coords = cmd.get_coords("enabled", 0)
+        if coords is not None:
+            h.update(coords.tobytes())
+    except Exception:
+        _add(("generation", _session_snapshot.generation))
+    try:
+        from pymol import setting as pymol_setting
+
+        _add(
+            [
+                cmd.get(name)
+                for name in pymol_setting.get_name_list()
+                if name not in _NON_VISUAL_SETTINGS
+            ]
+        )
+    except Exception:
+        _add(("generation", _session_snapshot.generation))
+    return h.hexdigest()
+
+
+def _render_cache_path(scene_hash):
+    return os.path.join(RENDER_CACHE_DIR, f"{scene_hash}.png")
+
+
+def _store_render(scene_hash, path):
+    """Copy a finished render into the cache and trim the oldest entries."""
+    try:
+        os.makedirs(RENDER_CACHE_DIR, exist_ok=True)
+        shutil.copyfile(path, _render_cache_path(scene_hash))
+        entries = sorted(
+            (os.path.join(RENDER_CACHE_DIR, f) for f in os.listdir(RENDER_CACHE_DIR)),
+            key=os.path.getmtime,
+        )
+        for old in entries[:-RENDER_CACHE_SIZE]:
+            os.unlink(old)
+    except OSError as exc:
+        print(f"  [Render] could not cache render: {exc}")
+
+
+def _tile_plan(width, height, tiles):
+    """Split the current view into horizontal bands for parallel ray tracing.
+
+    Each band gets its own view: the camera is shifted to the band centre and
+    the field of view narrowed to the band height, so it ray traces exactly
+    the rows it covers (plus a margin) at full resolution. Only orthoscopic
+    views tile exactly; returns None for perspective views, too few rows, or
+    when no image library is available to stitch the bands. A background
+    gradient would span each band rather than the frame, so bg_gradient
+    scenes are not tiled either.
+    """
+    view = list(cmd.get_view())
+    tiles = min(int(tiles or 1), height // RENDER_TILE_MIN_HEIGHT)
+    # view[17] is the field of view, negative in perspective mode
+    if tiles < 2 or view[17] <= 0 or _image_tools() is None:
+        return None
+    if cmd.get_setting_boolean("bg_gradient"):
+        return None
+    tan_half = math.tan(math.radians(view[17] / 2.0))
+    half_height = abs(view[11]) * tan_half
+    pixel = 2.0 * half_height / height
+    bounds = [round(i * height / tiles) for i in range(tiles + 1)]
+    plan = []
+    for top, bottom in zip(bounds, bounds[1:]):
+        render_top = max(0, top - RENDER_TILE_MARGIN)
+        render_bottom = min(height, bottom + RENDER_TILE_MARGIN)
+        rows = render_bottom - render_top
+        tile_view = list(view)
+        tile_view[10] = view[10] - (half_height - (render_top + render_bottom) / 2.0 * pixel)
+        tile_view[17] = 2.0 * math.degrees(math.atan(tan_half * rows / height))
+        plan.append(
+            {
+                "top": top,
+                "rows": bottom - top,
+                "render_top": render_top,
+                "render_height": rows,
+                "view": tile_view,
+            }
+        )
+    return plan
+
+
+def _stitch_tiles(out_path, width, height, dpi, tiles):
+    """Paste rendered bands [(tile, png path)] into one PNG at out_path."""
+    tools = _image_tools()
+    if tools == "pil":
+        import PIL.Image
+
+        image = PIL.Image.new("RGBA", (width, height))
+        for tile, path in tiles:
+            with PIL.Image.open(path) as band:
+                offset = tile["top"] - tile["render_top"]
+                image.paste(
+                    band.convert("RGBA").crop((0, offset, width, offset + tile["rows"])),
+                    (0, tile["top"]),
+                )
+        image.save(out_path, dpi=(dpi, dpi))
+        return
+    from pymol.Qt import QtCore, QtGui
+
+    image = QtGui.QImage(width, height, QtGui.QImage.Format_ARGB32)
+    image.fill(QtCore.Qt.transparent)
+    painter = QtGui.QPainter(image)
+    painter.setCompositionMode(QtGui.QPainter.CompositionMode_Source)
+    for tile, path in tiles:
+        offset = tile["top"] - tile["render_top"]
+        painter.drawImage(
+            QtCore.QPoint(0, tile["top"]),
+            QtGui.QImage(path),
+            QtCore.QRect(0, offset, width, tile["rows"]),
+        )
+    painter.end()
+    dots_per_meter = int(round(dpi / 0.0254))
+    image.setDotsPerMeterX(dots_per_meter)
+    image.setDotsPerMeterY(dots_per_meter)
+    if not image.save(out_path, "PNG"):
+        raise OSError(f"could not write {out_path}")
+
+
+class RenderQueue:
+    """Background ray tracing in separate headless PyMOL processes.
+
+    The scene is saved to a temporary session file on the main thread, then
+    rendered by `pymol -cq` so PyMOL and the agent stay responsive. At most
+    max_concurrent renders run at once; the rest wait in FIFO order.
+
+    Orthoscopic ray-traced renders are split into `tiles` horizontal bands,
+    each traced by its own single-threaded `pymol -cq` process and stitched
+    back together. tiles=0 uses one band per CPU core; tiles=1 disables it.
+    """
+
+    def __init__(self, max_concurrent=1, pymol_command=None, tiles=0):
+        self.max_concurrent = max_concurrent
+        self.pymol_command = pymol_command or [sys.executable, "-m", "pymol"]
+        self.tiles = tiles or max(1, (os.cpu_count() or 1) // max_concurrent)
+        self.jobs = OrderedDict()
+        self._slots = threading.Semaphore(max_concurrent)
+        self._lock = threading.Lock()
+        self._next_id = 1
+
+    def configure(self, max_concurrent=1, tiles=0):
+        """Change the limits; renders already running keep the old ones."""
+        with self._lock:
+            self.max_concurrent = max_concurrent
+            self.tiles = tiles or max(1, (os.cpu_count() or 1) // max_concurrent)
+            self._slots = threading.Semaphore(max_concurrent)
+
+    def submit(self, out_path, width, height, dpi, ray, scene_hash, tiles=None):
+        fd, session_path = tempfile.mkstemp(suffix=".pse")
+        os.close(fd)
+        cmd.save(session_path)
+        tiles = self.tiles if tiles is None else tiles
+        plan = _tile_plan(width, height, tiles) if ray and tiles > 1 else None
+        with self._lock:
+            job = {
+                "job_id": self._next_id,
+                "status": "queued",
+                "path": out_path,
+                "width": width,
+                "height": height,
+                "dpi": dpi,
+                "ray": ray,
+                "tiles": len(plan) if plan else 1,
+                "tile_plan": plan,
+                "scene_hash": scene_hash,
+                "session_path": session_path,
+                "queued_at": time.time(),
+                "started_at": None,
+                "finished_at": None,
+                "error": "",
+                "done": threading.Event(),
+            }
+            self.jobs[job["job_id"]] = job
+            self._next_id += 1
+        threading.Thread(target=self._run, args=(job,), daemon=True).start()
+        return job
+
+    def _pymol(self, session_path, script):
+        """Run one headless PyMOL on a session; returns an error string."""
+        try:
+            proc = subprocess.run(
+                self.pymol_command + ["-cq", session_path, "-d", script],
+                capture_output=True,
+                text=True,
+            )
+        except OSError as exc:
+            return f"Could not start PyMOL: {exc}"
+        if proc.returncode != 0:
+            return (proc.stderr or proc.stdout or "render failed")[-500:]
+        return ""
+
+    def _render_single(self, job):
+        script = (
+            f"/cmd.png({job['path']!r}, width={job['width']}, "
+            f"height={job['height']}, dpi={job['dpi']}, "
+            f"ray={1 if job['ray'] else 0}, quiet=1)"
+        )
+        error = self._pymol(job["session_path"], script)
+        if not error and not os.path.exists(job["path"]):
+            error = "render failed"
+        return error
+
+    def _render_tiled(self, job):
+        from concurrent.futures import ThreadPoolExecutor
+
+        tile_dir = tempfile.mkdtemp(prefix="chatmol_tiles_")
+        outputs = []
+
+        def _render_tile(tile):
+            path = os.path.join(tile_dir, f"tile_{tile['top']}.png")
+            # One thread per process: the bands already use every core
+            script = (
+                f"/cmd.set('max_threads', 1); cmd.set_view({tile['view']!r}); "
+                f"cmd.png({path!r}, width={job['width']}, "
+                f"height={tile['render_height']}, dpi={job['dpi']}, ray=1, quiet=1)"
+            )
+            error = self._pymol(job["session_path"], script)
+            if not error and not os.path.exists(path):
+                error = "tile render failed"
+            return tile, path, error
+
+        try:
+            with ThreadPoolExecutor(max_workers=len(job["tile_plan"])) as pool:
+                for tile, path, error in pool.map(_render_tile, job["tile_plan"]):
+                    if error:
+                        return error
+                    outputs.append((tile, path))
+            _stitch_tiles(job["path"], job["width"], job["height"], job["dpi"], outputs)
+            return ""
+        except Exception as exc:
+            return f"Could not stitch tiles: {exc}"
+        finally:
+            shutil.rmtree(tile_dir, ignore_errors=True)
+
+    def _run(self, job):
+        with self._slots:
+            job["status"] = "running"
+            job["started_at"] = time.time()
+            try:
+                if job["tile_plan"]:
+                    error = self._render_tiled(job)
+                    if error:
+                        print(f"  [Render] tiled render failed, retrying in one process: {error}")
+                        job["tiles"] = 1
+                        error = self._render_single(job)
+                else:
+                    error = self._render_single(job)
+                job["error"] = error
+            finally:
+                try:
+                    os.unlink(job["session_path"])
+                except OSError:
+                    pass
+        job["finished_at"] = time.time()
+        if job["error"]:
+            job["status"] = "failed"
+        else:
+            job["status"] = "done"
+            if job["scene_hash"]:
+                _store_render(job["scene_hash"], job["path"])
+        elapsed = job["finished_at"] - job["started_at"]
+        tiles = f" ({job['tiles']} tiles)" if job["tiles"] > 1 else ""
+        print(
+            f"  [Render] job {job['job_id']} {job['status']} in {elapsed:.1f}s"
+            f"{tiles}: {job['path']}"
+        )
+        job["done"].set()
+
+    def status(self, job_id=None):
+        now = time.time()
+        with self._lock:
+            jobs = [self.jobs[job_id]] if job_id in self.jobs else list(self.jobs.values())
+            queued = [j["job_id"] for j in self.jobs.values() if j["status"] == "queued"]
+        out = []
+        for job in jobs:
+            info = {
+                k: job[k]
+                for k in ("job_id", "status", "path", "width", "height", "tiles", "error")
+            }
+            if job["status"] == "queued":
+                info["queue_position"] = queued.index(job["job_id"]) + 1
+                info["waiting_s"] = round(now - job["queued_at"], 1)
+            elif job["started_at"]:
+                end = job["finished_at"] or now
+                info["elapsed_s"] = round(end - job["started_at"], 1)
+            if job["status"] == "done":
+                info["bytes"] = os.path.getsize(job["path"]) if os.path.exists(job["path"]) else 0
+            out.append(info)
+        return out
+
+
+_render_queue = RenderQueue()
+
+
 def _tool_render(
     path,
     width=None,
@@ -444,6 +1166,7 @@ def _tool_render(
     ray=None,
     transparent_bg=True,
     purpose="preview",
+    background=None,
 ):
     out_path = os.path.abspath(os.path.expanduser(path))
     out_dir = os.path.dirname(out_path)
@@ -479,12 +1202,8 @@ def _tool_render(
     ray_flag = 1 if _to_bool(ray, default=default_ray) else 0
     transparent = _to_bool(transparent_bg, default=True)
     cmd.set("ray_opaque_background", 0 if transparent else 1)
-    cmd.png(out_path, width=width, height=height, dpi=dpi, ray=ray_flag, quiet=1)
-
-    exists = os.path.exists(out_path)
-    size = os.path.getsize(out_path) if exists else 0
-    return {
-        "ok": exists,
+    result = {
+        "ok": True,
         "tool": "render",
         "path": out_path,
         "purpose": purpose,
@@ -493,34 +1212,175 @@ def _tool_render(
         "dpi": dpi,
         "ray": bool(ray_flag),
         "transparent_bg": transparent,
-        "bytes": size,
     }
 
+    # Only ray tracing is slow enough to be worth hashing the whole scene;
+    # OpenGL renders take about as long as the hash itself
+    scene_hash = None
+    if ray_flag:
+        scene_hash = _scene_hash(
+            {"width": width, "height": height, "dpi": dpi, "ray": ray_flag}
+        )
+        cached = _render_cache_path(scene_hash)
+        if os.path.exists(cached):
+            if os.path.abspath(cached) != out_path:
+                shutil.copyfile(cached, out_path)
+            os.utime(cached)
+            result.update({"cached": True, "bytes": os.path.getsize(out_path)})
+            return result
+
+    # Ray-traced renders run in the background unless asked otherwise;
+    # OpenGL renders need this process's viewport and stay synchronous.
+    if ray_flag and _to_bool(background, default=purpose == "final"):
+        job = _render_queue.submit(out_path, width, height, dpi, ray_flag, scene_hash)
+        result.update(
+            {
+                "status": "queued",
+                "job_id": job["job_id"],
+                "tiles": job["tiles"],
+                "note": "Rendering in the background; check with render_status.",
+            }
+        )
+        return result
+
+    cmd.png(out_path, width=width, height=height, dpi=dpi, ray=ray_flag, quiet=1)
+    exists = os.path.exists(out_path)
+    if exists and scene_hash:
+        _store_render(scene_hash, out_path)
+    result.update({"ok": exists, "bytes": os.path.getsize(out_path) if exists else 0})
+    return result
 
-def _tool_capture_viewport(analysis_prompt=None, client=None, vision_model=None):
-    if analysis_prompt is None:
-        analysis_prompt = "Describe what you see in this molecular visualization."
 
+def _tool_render_status(job_id=None):
+    try:
+        job_id = None if job_id is None else int(job_id)
+    except (TypeError, ValueError):
+        job_id = None
+    return {"ok": True, "tool": "render_status", "jobs": _render_queue.status(job_id)}
+
+
+# Vision descriptions by (image hash, prompt, model), most recent last
+_VISION_CACHE = OrderedDict()
+_VISION_CACHE_SIZE = 32
+
+
+def _capture_png(width, height):
+    """PNG bytes of the current viewport, in memory when PyMOL supports it."""
+    try:
+        data = cmd.png(None, width=width, height=height, ray=0, quiet=1)
+    except Exception:
+        data = None  # builds that want a filename raise instead of returning None
+    if isinstance(data, bytes) and data:
+        return data
+    # Older PyMOL: write a temp file, waiting only until it appears
     tmp = tempfile.NamedTemporaryFile(suffix=".png", delete=False)
     tmp_path = tmp.name
     tmp.close()
-
     try:
-        cmd.png(tmp_path, width=800, height=600, ray=0, quiet=1)
-        time.sleep(0.5)
+        cmd.png(tmp_path, width=width, height=height, ray=0, quiet=1)
+        deadline = time.monotonic() + 2.0
+        while not os.path.getsize(tmp_path) and time.monotonic() < deadline:
+            time.sleep(0.02)
         with open(tmp_path, "rb") as f:
-            img_data = base64.b64encode(f.read()).decode("ascii")
+            return f.read()
+    finally:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+
+
+def _image_tools():
+    """Return "pil", "qt" or None, whichever image library is importable."""
+    try:
+        import PIL.Image  # noqa: F401
+
+        return "pil"
+    except ImportError:
+        pass
+    try:
+        from pymol.Qt import QtGui  # noqa: F401
+
+        return "qt"
+    except ImportError:
+        return None
+
+
+def _image_hash(png_bytes, tools):
+    """Perceptual hash: a 32x24 RGB thumbnail quantized to 6 bits per channel.
+
+    Coarse enough to ignore antialiasing noise, fine enough to notice a
+    recoloured ligand. Falls back to an exact hash without an image library.
+    """
+    size = (32, 24)
+    if tools == "pil":
+        import io
+        import PIL.Image
+
+        thumb = PIL.Image.open(io.BytesIO(png_bytes)).convert("RGB")
+        pixels = thumb.resize(size, PIL.Image.BILINEAR).tobytes()
+    elif tools == "qt":
+        from pymol.Qt import QtCore, QtGui
+
+        image = QtGui.QImage.fromData(png_bytes, "PNG").scaled(
+            size[0], size[1], QtCore.Qt.IgnoreAspectRatio, QtCore.Qt.SmoothTransformation
+        )
+        pixels = bytes(
+            channel
+            for y in range(size[1])
+            for x in range(size[0])
+            for channel in QtGui.QColor(image.pixel(x, y)).getRgb()[:3]
+        )
+    else:
+        return hashlib.sha1(png_bytes).hexdigest()
+    return hashlib.sha1(bytes(v >> 2 for v in pixels)).hexdigest()
+
+
+def _encode_image(png_bytes, tools, fmt, quality):
+    """Re-encode PNG bytes as JPEG or WebP; returns (bytes, mime)."""
+    fmt = (fmt or "png").lower()
+    if fmt == "jpg":
+        fmt = "jpeg"
+    if fmt not in ("jpeg", "webp") or tools is None:
+        return png_bytes, "image/png"
+    if tools == "pil":
+        import io
+        import PIL.Image
+
+        out = io.BytesIO()
+        image = PIL.Image.open(io.BytesIO(png_bytes)).convert("RGB")
+        try:
+            image.save(out, format=fmt.upper(), quality=quality)
+        except (KeyError, OSError):
+            return png_bytes, "image/png"  # no encoder for this format
+        return out.getvalue(), f"image/{fmt}"
+    from pymol.Qt import QtCore, QtGui
+
+    image = QtGui.QImage.fromData(png_bytes, "PNG")
+    buf = QtCore.QBuffer()
+    buf.open(QtCore.QIODevice.WriteOnly)
+    if not image.save(buf, fmt.upper(), quality):
+        return png_bytes, "image/png"  # Qt image plugin missing
+    return bytes(buf.data()), f"image/{fmt}"
+
+
+def _tool_capture_viewport(
+    analysis_prompt=None, client=None, vision_model=None, vision_options=None
+):
+    if analysis_prompt is None:
+        analysis_prompt = "Describe what you see in this molecular visualization."
+    options = vision_options or {}
+
+    try:
+        png_bytes = _capture_png(
+            int(options.get("width", 800)), int(options.get("height", 600))
+        )
     except Exception as exc:
         return {
             "ok": False,
             "tool": "capture_viewport",
             "error": f"Failed to capture viewport: {exc}",
         }
-    finally:
-        try:
-            os.unlink(tmp_path)
-        except OSError:
-            pass
 
     if not vision_model or not client:
         return {
@@ -529,20 +1389,261 @@ def _tool_capture_viewport(analysis_prompt=None, client=None, vision_model=None)
             "error": "No vision model configured. Use set_vision_model <model>.",
         }
 
-    try:
-        description = client.vision_completion(vision_model, analysis_prompt, img_data)
+    tools = _image_tools()
+    cache_key = (_image_hash(png_bytes, tools), analysis_prompt, vision_model)
+    if cache_key in _VISION_CACHE:
+        _VISION_CACHE.move_to_end(cache_key)
         return {
             "ok": True,
             "tool": "capture_viewport",
             "analysis_prompt": analysis_prompt,
-            "description": description,
+            "description": _VISION_CACHE[cache_key],
+            "cached": True,
         }
+
+    image, mime = _encode_image(
+        png_bytes, tools, options.get("format", "jpeg"), int(options.get("quality", 85))
+    )
+    img_data = base64.b64encode(image).decode("ascii")
+    try:
+        description = client.vision_completion(
+            vision_model, analysis_prompt, img_data, mime=mime
+        )
     except Exception as exc:
         return {
             "ok": False,
             "tool": "capture_viewport",
             "error": f"Vision analysis failed: {exc}",
         }
+    _VISION_CACHE[cache_key] = description
+    while len(_VISION_CACHE) > _VISION_CACHE_SIZE:
+        _VISION_CACHE.popitem(last=False)
+    return {
+        "ok": True,
+        "tool": "capture_viewport",
+        "analysis_prompt": analysis_prompt,
+        "description": description,
+    }
+
+
+# Local intent fast path: prompts made only of common requests are mapped
+# onto the recipes in pymol_skill/references/recipes.md without an LLM call.
+# Each entry is (name, clause pattern, command templates, defaults); a clause
+# must match a pattern in full, and templates are filled from its groups.
+_OBJECT = r"(?:(?:it|them|everything|all|the\s+(?:protein|structure|molecule))\s+)?"
+_SURFACE_CARTOON = (
+    r"(?:show\s+)?(?:a\s+|the\s+)?{transparent}surface\s+"
+    r"(?:plus|and|with|\+|over|on)\s+(?:a\s+|the\s+)?cartoons?"
+    r"|(?:show\s+)?(?:a\s+|the\s+)?cartoons?\s+(?:plus|and|with|\+|under)\s+"
+    r"(?:a\s+|the\s+)?{transparent}surface"
+)
+# Ligand residue names taken from a prompt: written in capitals (ZER, 0QE)
+# or a common cofactor; words and placeholders never count
+_KNOWN_LIGANDS = {
+    "ATP", "ADP", "AMP", "ANP", "GTP", "GDP", "NAD", "NAP", "NDP", "FAD",
+    "FMN", "HEM", "HEC", "SAM", "SAH", "COA", "PLP", "TPP", "GLC", "NAG",
+}
+_NOT_LIGANDS = {"A", "AN", "THE", "IT", "ITS", "ONE", "THIS", "LIG", "ALL", "ANY"}
+INTENT_RECIPES = [
+    (
+        "fetch",
+        r"(?:fetch|load|download|open|get)\s+(?:the\s+)?(?:pdb\s+)?(?:(?:entry|id|structure)\s+)?"
+        r"(?P<pdb>[0-9][a-z0-9]{3})(?:\s+from\s+(?:the\s+)?(?:rcsb|pdb|protein\s+data\s+bank))?",
+        ["fetch {pdb}, async=0"],
+        {},
+    ),
+    (
+        "cartoon_only",
+        r"(?:show|display)\s+" + _OBJECT + r"(?:as|in)\s+(?:a\s+)?cartoons?(?:\s+only)?"
+        r"|(?:show\s+)?(?:the\s+)?cartoons?\s+only|show\s+only\s+(?:the\s+)?cartoons?",
+        ["hide everything", "show cartoon", "dss"],
+        {},
+    ),
+    (
+        "show_cartoon",
+        r"(?:show|display)\s+(?:the\s+|a\s+)?cartoons?",
+        ["show cartoon"],
+        {},
+    ),
+    (
+        "color_chains",
+        r"colou?r\s+" + _OBJECT + r"by\s+chains?(?:\s+ids?)?",
+        ['util.color_chains("(all) and elem C", _self=cmd)', 'util.cnc("all", _self=cmd)'],
+        {},
+    ),
+    (
+        "color_ss",
+        r"colou?r\s+" + _OBJECT + r"by\s+(?:(?:the\s+)?secondary\s+structures?|ss)",
+        ["dss", "color red, ss h", "color yellow, ss s", "color green, ss l+''"],
+        {},
+    ),
+    (
+        "color_rainbow",
+        r"colou?r\s+" + _OBJECT + r"(?:as\s+(?:a\s+)?|in\s+(?:a\s+)?)?rainbow"
+        r"|rainbow\s+colou?r(?:ing)?",
+        ['util.chainbow("all and not het")'],
+        {},
+    ),
+    (
+        "color_bfactor",
+        r"colou?r\s+" + _OBJECT + r"by\s+(?:(?:the\s+)?b[- ]?factors?|plddt|confidence)",
+        ["spectrum b, blue_white_red, all"],
+        {},
+    ),
+    (
+        "binding_site",
+        r"(?:show|display|highlight)\s+(?:the\s+)?(?:ligand\s+)?binding\s+(?:site|pocket)"
+        r"(?:\s+(?:around|of|for|near)\s+(?:the\s+)?(?:ligand|(?:ligand\s+)?(?P<resn>[a-z0-9]{1,3})))?"
+        r"(?:\s+within\s+(?P<cutoff>\d+(?:\.\d+)?)\s*(?:a|å|angstroms?)?)?",
+        [
+            "select ligand, {ligand}",
+            "select binding, byres (ligand around {cutoff}) and not ligand",
+            "select protein, not ligand and not resn HOH",
+            "hide everything",
+            "show cartoon, protein",
+            "set cartoon_transparency, 0.7",
+            'cmd.show("sticks", "((byres binding) & (sc. | (n. CA) | (n. N & r. PRO)))")',
+            "color gray70, binding and elem C",
+            'util.cnc("binding", _self=cmd)',
+            "set stick_radius, 0.2",
+            "show sticks, ligand",
+            "show spheres, ligand",
+            "set sphere_scale, 0.25, ligand",
+            "set stick_radius, 0.15, ligand",
+            "set valence, 1, ligand",
+            "color marine, ligand and elem C",
+            'util.cnc("ligand", _self=cmd)',
+            "dist hbonds, ligand, binding, mode=2",
+            "hide labels, hbonds",
+            "set dash_color, black, hbonds",
+            "orient ligand",
+            "zoom ligand, 6",
+        ],
+        {"resn": None, "cutoff": "4.0"},
+    ),
+    (
+        "surface_cartoon",
+        _SURFACE_CARTOON.format(transparent=""),
+        ["show cartoon", "show surface"],
+        {},
+    ),
+    (
+        "transparent_surface_cartoon",
+        _SURFACE_CARTOON.format(transparent=r"(?:semi-?)?transparent\s+"),
+        ["show cartoon", "show surface", "set transparency, 0.5"],
+        {},
+    ),
+    (
+        "show_surface",
+        r"(?:show|display|add)\s+(?:a\s+|the\s+)?(?:molecular\s+)?surfaces?",
+        ["show surface"],
+        {},
+    ),
+    (
+        "remove_solvent",
+        r"(?:remove|delete)\s+(?:the\s+|all\s+)?(?:waters?|solvent|hoh)(?:\s+molecules)?",
+        ["remove solvent"],
+        {},
+    ),
+    (
+        "hide_solvent",
+        r"hide\s+(?:the\s+|all\s+)?(?:waters?|solvent|hoh)(?:\s+molecules)?",
+        ["hide everything, solvent"],
+        {},
+    ),
+    (
+        "background",
+        r"(?:(?:set|make|change)\s+)?(?:the\s+)?(?:background|bg)(?:\s+colou?r)?\s+"
+        r"(?:to\s+|as\s+)?(?P<color>white|black|grey|gray)",
+        ["bg_color {color}"],
+        {},
+    ),
+    (
+        "orient",
+        r"orient(?:\s+(?:it|the\s+(?:view|structure|molecule|protein)))?"
+        r"|reset\s+(?:the\s+)?view|center\s+(?:the\s+)?(?:view|structure|molecule|protein)",
+        ["orient"],
+        {},
+    ),
+    (
+        "goodsell",
+        r"(?:(?:make\s+it|use|apply|render\s+in)\s+)?(?:a\s+)?goodsell(?:[- ]style)?(?:\s+style)?",
+        [
+            "bg_color white",
+            "set ray_trace_mode, 3",
+            "set ray_trace_color, black",
+            "unset specular",
+            "set ray_trace_gain, 0",
+            "unset depth_cue",
+            "set ambient, 1.0",
+            "set direct, 0.0",
+            "set reflect, 0.0",
+            "set ray_shadow, 0",
+        ],
+        {},
+    ),
+]
+_INTENT_PATTERNS = [
+    (name, re.compile(pattern, re.I), templates, defaults)
+    for name, pattern, templates, defaults in INTENT_RECIPES
+]
+_INTENT_POLITE = re.compile(r"^(?:(?:please|pls|can\s+you|could\s+you|now)\s+)+|\s+please$", re.I)
+_INTENT_CLAUSE_SPLIT = re.compile(
+    r"\s*[,;]\s*(?:and\s+)?(?:then\s+)?|\s+(?:and\s+)?then\s+", re.I
+)
+_INTENT_AND_SPLIT = re.compile(r"\s+(?:and|&)\s+", re.I)
+
+
+def _is_ligand_name(word):
+    name = word.upper()
+    if name in _NOT_LIGANDS:
+        return False
+    return name in _KNOWN_LIGANDS or (word == name and len(name) >= 2 and name.isalnum())
+
+
+def _match_clause(clause):
+    clause = _INTENT_POLITE.sub("", clause.strip().rstrip(".!").strip())
+    for name, pattern, templates, defaults in _INTENT_PATTERNS:
+        m = pattern.fullmatch(clause)
+        if not m:
+            continue
+        values = dict(defaults)
+        values.update({k: v for k, v in m.groupdict().items() if v})
+        if "resn" in values:
+            resn = values["resn"]
+            if resn and not _is_ligand_name(resn):
+                return None  # ambiguous target: let the agent work it out
+            values["ligand"] = f"resn {resn.upper()}" if resn else "organic"
+        return name, [line.format(**values) for line in templates]
+    return None
+
+
+def match_intent(message):
+    """Map a prompt onto recipe commands, or return None.
+
+    Only confident matches are returned: every clause of the prompt must
+    match a recipe in full, otherwise the prompt goes to the agent loop.
+    Returns {"recipes": [...], "commands": "..."}.
+    """
+    text = " ".join(message.split())
+    if not text or len(text) > 200 or "?" in text:
+        return None
+    recipes, commands = [], []
+    for clause in _INTENT_CLAUSE_SPLIT.split(text):
+        if not clause:
+            continue
+        matched = _match_clause(clause)
+        parts = [matched] if matched else [
+            _match_clause(part) for part in _INTENT_AND_SPLIT.split(clause)
+        ]
+        if not all(parts):
+            return None
+        for name, lines in parts:
+            recipes.append(name)
+            commands.extend(lines)
+    if not recipes:
+        return None
+    return {"recipes": recipes, "commands": "\n".join(commands)}
 
 
 # ---------------------------------------------------------------------------
@@ -552,15 +1653,18 @@ def _tool_capture_viewport(analysis_prompt=None, client=None, vision_model=None)
 SYSTEM_PROMPT = """\
 You are ChatMol, an expert AI assistant for PyMOL molecular visualization.
 
-You have 4 tools:
+You have 5 tools:
 - `inspect_session`: See what's loaded in PyMOL (objects, chains, atoms, selections).
 - `run_pymol_commands`: Execute any PyMOL commands (selections, styling, coloring, \
 distances, presets, fetch, etc.). Commands are newline-separated.
-- `render`: Export an image (preview or final quality).
+- `render`: Export an image (preview or final quality). Final renders run in the \
+background; keep working and check them with `render_status`.
+- `render_status`: Progress of background renders.
 - `capture_viewport`: Screenshot + vision analysis to check your work visually.
 
 Workflow:
 1. For non-trivial requests, start with `inspect_session` to understand the current state.
+   Later, pass its `revision` as `diff_since` to see only what changed.
 2. Use `run_pymol_commands` for all PyMOL operations. You know PyMOL well — use \
 cmd.select, cmd.show, cmd.hide, cmd.color, cmd.set, cmd.distance, cmd.zoom, \
 cmd.orient, util.color_chains, util.cnc, preset.ligand_sites_hq, etc.
@@ -588,11 +1692,19 @@ Rules:
 # ---------------------------------------------------------------------------
 
 
+class AgentCancelled(RuntimeError):
+    """The user stopped the agent loop."""
+
+
 class ChatMolAgent:
     """Simple agentic loop: call LLM, execute tools, repeat."""
 
     CONFIG_PATH = os.path.expanduser("~/.PyMOL/chatmol_config.json")
 
+    # OpenRouter models that take Anthropic-style cache_control breakpoints.
+    # Other providers cache a byte-identical prompt prefix automatically.
+    CACHE_CONTROL_MODEL_PREFIXES = ("anthropic/",)
+
     DEFAULT_CONFIG = {
         "provider": "openrouter",
         "api_keys": {},
@@ -602,13 +1714,42 @@ class ChatMolAgent:
         "max_tokens": 4096,
         "max_iterations": 50,
         "max_tool_calls": 30,
+        "stream": True,
+        "prompt_cache": True,
+        "history_token_budget": 16000,
+        "vision_image_width": 800,
+        "vision_image_height": 600,
+        "vision_image_format": "jpeg",
+        "vision_image_quality": 85,
+        "max_concurrent_renders": 1,
+        "render_tiles": 0,
+        "fast_path": True,
     }
 
+    # History compaction: executed-command echoes kept per tool result, tool
+    # outputs that a newer call of the same tool supersedes, the number of
+    # trailing messages never folded into the summary, and the summary's
+    # line caps (user requests past their cap are only counted).
+    COMPACT_MAX_ECHOED_COMMANDS = 6
+    SUPERSEDED_TOOLS = ("inspect_session", "capture_viewport")
+    COMPACT_KEEP_RECENT = 6
+    COMPACT_SUMMARY_LINES = 40
+    COMPACT_SUMMARY_USER_LINES = 12
+
     def __init__(self):
         os.makedirs(os.path.dirname(self.CONFIG_PATH), exist_ok=True)
         self.config = self._load_config()
         self._reinit_client()
         self.conversation_history = []
+        self.usage_totals = {
+            "requests": 0,
+            "prompt_tokens": 0,
+            "cached_tokens": 0,
+            "completion_tokens": 0,
+        }
+        self.fast_path_stats = {"prompts": 0, "matched": 0, "saved_s": 0.0}
+        # Recent agent-loop wall time: what a fast-path match avoids
+        self._agent_turn_s = None
 
     # -- config persistence -------------------------------------------------
 
@@ -654,7 +1795,10 @@ class ChatMolAgent:
     def _reinit_client(self):
         prov_name = self.config.get("provider", "openrouter")
         api_key = self._resolve_api_key()
+        previous = getattr(self, "client", None)
         self.client = LLMClient(prov_name, api_key)
+        if previous is None or previous.base_url != self.client.base_url:
+            prewarm_connection(self.client.base_url)
 
     # -- PyMOL-registered commands ------------------------------------------
 
@@ -799,6 +1943,37 @@ class ChatMolAgent:
         print(f"  max_tokens: {self.config.get('max_tokens', 4096)}")
         print(f"  max_iterations: {self.config.get('max_iterations', 50)}")
         print(f"  max_tool_calls: {self.config.get('max_tool_calls', 30)}")
+        print(f"  stream: {self.config.get('stream', True)}")
+        print(f"  prompt_cache: {self.config.get('prompt_cache', True)}")
+        print(
+            f"  history_token_budget: {self.config.get('history_token_budget', 16000)}"
+        )
+        print(f"  max_concurrent_renders: {self.config.get('max_concurrent_renders', 1)}")
+        print(f"  render_tiles: {self.config.get('render_tiles', 0) or 'auto'}")
+        fast = self.fast_path_stats
+        print(
+            f"  fast_path: {self.config.get('fast_path', True)} "
+            f"({fast['matched']}/{fast['prompts']} prompts matched, "
+            f"~{fast['saved_s']:.1f}s saved)"
+        )
+        vision = self.vision_options()
+        print(
+            f"  vision_image: {vision['width']}x{vision['height']} "
+            f"{vision['format']} (quality {vision['quality']})"
+        )
+        totals = self.usage_totals
+        if totals["requests"]:
+            print(
+                f"  usage: {totals['requests']} requests, "
+                f"{totals['prompt_tokens']} prompt tokens "
+                f"({totals['cached_tokens']} cached), "
+                f"{totals['completion_tokens']} completion tokens"
+            )
+        stats = connection_stats(self.client.base_url)
+        print(
+            f"  connections: {stats['requests']} requests over "
+            f"{stats['connections']} connections ({stats['reused']} reused)"
+        )
         stored = [k for k, v in self.config.get("api_keys", {}).items() if v]
         if stored:
             print(f"  keys stored for: {', '.join(stored)}")
@@ -806,11 +1981,30 @@ class ChatMolAgent:
     # -- agentic loop -------------------------------------------------------
 
     def _chat_completion_with_retry(
-        self, model, messages, tool_defs, temperature, max_tokens, phase_callback=None
+        self,
+        model,
+        messages,
+        tool_defs,
+        temperature,
+        max_tokens,
+        phase_callback=None,
+        text_callback=None,
+        tool_call_callback=None,
+        retry_callback=None,
     ):
         max_attempts = 4
         for attempt in range(1, max_attempts + 1):
             try:
+                if self.config.get("stream", True):
+                    return self.client.chat_completion_stream(
+                        model,
+                        messages,
+                        tools=tool_defs,
+                        temperature=temperature,
+                        max_tokens=max_tokens,
+                        on_text=text_callback,
+                        on_tool_call=tool_call_callback,
+                    )
                 return self.client.chat_completion(
                     model,
                     messages,
@@ -830,6 +2024,8 @@ class ChatMolAgent:
                 )
                 if phase_callback:
                     phase_callback("Retrying API request")
+                if retry_callback:
+                    retry_callback()
                 time.sleep(delay)
 
     @staticmethod
@@ -892,17 +2088,362 @@ class ChatMolAgent:
             return tool_executor_override
         client = self.client
         vision_model = self.config.get("vision_model", "")
+        vision_options = self.vision_options()
 
         def _executor(tool_name, arguments):
             return execute_tool(
-                tool_name, arguments, client=client, vision_model=vision_model
+                tool_name,
+                arguments,
+                client=client,
+                vision_model=vision_model,
+                vision_options=vision_options,
             )
 
         return _executor
 
+    def vision_options(self):
+        """Capture size and encoding for capture_viewport, from the config."""
+        return {
+            "width": self.config.get("vision_image_width", 800),
+            "height": self.config.get("vision_image_height", 600),
+            "format": self.config.get("vision_image_format", "jpeg"),
+            "quality": self.config.get("vision_image_quality", 85),
+        }
+
+    def _uses_cache_control(self, model):
+        return (
+            self.config.get("prompt_cache", True)
+            and self.config.get("provider", "openrouter") == "openrouter"
+            and model.startswith(self.CACHE_CONTROL_MODEL_PREFIXES)
+        )
+
+    def _build_messages(self, model):
+        """System prompt + history, in an order that keeps the prefix stable.
+
+        Nothing before the newest message changes between iterations, so
+        providers with automatic prefix caching reuse it. For models that
+        need explicit breakpoints, the system prompt (with the tool
+        definitions ahead of it) and the newest message are marked
+        cacheable; the history itself is not modified.
+        """
+        if not self._uses_cache_control(model):
+            messages = [{"role": "system", "content": SYSTEM_PROMPT}]
+            messages += self.conversation_history
+            return messages
+
+        def _cached(entry):
+            entry = dict(entry)
+            content = entry.get("content")
+            if isinstance(content, str) and content:
+                entry["content"] = [
+                    {
+                        "type": "text",
+                        "text": content,
+                        "cache_control": {"type": "ephemeral"},
+                    }
+                ]
+            return entry
+
+        messages = [_cached({"role": "system", "content": SYSTEM_PROMPT})]
+        messages += self.conversation_history
+        if len(messages) > 1:
+            messages[-1] = _cached(messages[-1])
+        return messages
+
+    def _record_usage(self, data):
+        """Add the response's token usage (including cache hits) to the totals."""
+        usage = data.get("usage") or {}
+        details = usage.get("prompt_tokens_details") or {}
+        cached = details.get("cached_tokens")
+        if cached is None:
+            cached = usage.get("prompt_cache_hit_tokens", 0)  # DeepSeek
+        counts = {
+            "requests": 1,
+            "prompt_tokens": usage.get("prompt_tokens") or 0,
+            "cached_tokens": cached or 0,
+            "completion_tokens": usage.get("completion_tokens") or 0,
+        }
+        for key, value in counts.items():
+            self.usage_totals[key] += value
+        return counts
+
+    # -- history compaction -------------------------------------------------
+
+    @staticmethod
+    def _estimate_tokens(messages):
+        return len(json.dumps(messages, ensure_ascii=False)) // 4
+
+    def _compact_tool_result(self, tool_name, result):
+        """Shorten a tool result before it enters the history.
+
+        Done once at insertion so the stored prefix stays byte-stable; the
+        model already knows which commands it sent, so only counts, errors
+        and a few executed lines are kept.
+        """
+        if tool_name != "run_pymol_commands":
+            return result
+        try:
+            data = json.loads(result)
+        except (json.JSONDecodeError, TypeError):
+            return result
+        executed = data.get("executed")
+        keep = self.COMPACT_MAX_ECHOED_COMMANDS
+        if not isinstance(executed, list) or len(executed) <= keep:
+            return result
+        data["executed"] = executed[: keep // 2] + executed[-(keep - keep // 2) :]
+        data["executed_omitted"] = len(executed) - keep
+        timings = data.pop("timings_ms", None)
+        if isinstance(timings, list) and timings:
+            # Per-command timings only matter for the slow ones
+            slowest = max(range(len(timings)), key=timings.__getitem__)
+            data["slowest_command"] = {
+                "command": executed[slowest],
+                "ms": timings[slowest],
+            }
+        return json.dumps(data, ensure_ascii=False)
+
+    def _tool_names_by_call_id(self):
+        names = {}
+        for entry in self.conversation_history:
+            for tc in entry.get("tool_calls") or []:
+                names[tc.get("id")] = (tc.get("function") or {}).get("name", "")
+        return names
+
+    @staticmethod
+    def _digest_tool_result(tool_name, content):
+        try:
+            data = json.loads(content)
+        except (json.JSONDecodeError, TypeError):
+            return content
+        if not isinstance(data, dict) or data.get("superseded"):
+            return content
+        digest = {"ok": data.get("ok"), "tool": tool_name, "superseded": True}
+        if tool_name == "inspect_session":
+            digest["revision"] = data.get("revision")
+            digest["objects"] = [o.get("name") for o in data.get("objects", [])]
+        elif tool_name == "capture_viewport" and data.get("description"):
+            description = str(data["description"])
+            digest["description"] = (
+                description[:160] + "..." if len(description) > 160 else description
+            )
+        if data.get("error"):
+            digest["error"] = data["error"]
+        return json.dumps(digest, ensure_ascii=False)
+
+    def _digest_superseded(self):
+        """Replace all but the latest output of each SUPERSEDED_TOOLS tool with digests."""
+        names = self._tool_names_by_call_id()
+        outputs = {}
+        for entry in self.conversation_history:
+            tool_name = names.get(entry.get("tool_call_id"))
+            if entry.get("role") == "tool" and tool_name in self.SUPERSEDED_TOOLS:
+                outputs.setdefault(tool_name, []).append(entry)
+        for tool_name, entries in outputs.items():
+            for entry in entries[:-1]:
+                entry["content"] = self._digest_tool_result(tool_name, entry["content"])
+
+    def _summarize_old_turns(self):
+        """Fold the oldest messages into one summary past the token budget.
+
+        Messages are dropped from the front down to half the budget, so the
+        cached prefix is only invalidated once in a while; superseded tool
+        outputs are digested at the same time. Between compactions the
+        history is append-only. The cut always falls before a user or
+        assistant message, never between a tool call and its result.
+        """
+        budget = int(self.config.get("history_token_budget", 16000) or 0)
+        history = self.conversation_history
+        if budget <= 0 or self._estimate_tokens(history) <= budget:
+            return False
+        self._digest_superseded()
+        cut = 0
+        limit = len(history) - self.COMPACT_KEEP_RECENT
+        for i in range(1, max(limit, 0) + 1):
+            if history[i].get("role") == "tool":
+                continue
+            cut = i
+            if self._estimate_tokens(history[i:]) <= budget // 2:
+                break
+        if cut == 0:
+            return False
+
+        names = self._tool_names_by_call_id()
+        lines = []
+        omitted = 0
+        for entry in history[:cut]:
+            role = entry.get("role")
+            content = entry.get("content") or ""
+            if not isinstance(content, str):
+                content = json.dumps(content, ensure_ascii=False)
+            if role == "user":
+                if content.startswith("[Summary of earlier conversation]"):
+                    for line in content.splitlines()[1:]:
+                        m = re.match(r"^- \((\d+) earlier user requests omitted\)$", line)
+                        if m:
+                            omitted += int(m.group(1))
+                        else:
+                            lines.append(line)
+                else:
+                    lines.append(f"- User: {content[:300]}")
+            elif role == "assistant" and content.strip():
+                lines.append(f"- Assistant: {content.strip()[:300]}")
+            elif role == "tool":
+                lines.append(f"  - tool {names.get(entry.get('tool_call_id'), '?')} was called")
+        # The most recent user requests are kept even when older than the
+        # other kept lines; earlier ones are only counted
+        user_lines = [i for i, line in enumerate(lines) if line.startswith("- User:")]
+        kept_users = set(user_lines[-self.COMPACT_SUMMARY_USER_LINES :])
+        omitted += len(user_lines) - len(kept_users)
+        first_kept = len(lines) - self.COMPACT_SUMMARY_LINES
+        lines = [
+            line
+            for i, line in enumerate(lines)
+            if i in kept_users or (i >= first_kept and not line.startswith("- User:"))
+        ]
+        if omitted:
+            lines.insert(0, f"- ({omitted} earlier user requests omitted)")
+        summary = {
+            "role": "user",
+            "content": "[Summary of earlier conversation]\n" + "\n".join(lines),
+        }
+        self.conversation_history = [summary] + history[cut:]
+        print(f"  [History] folded {cut} earlier messages into a summary")
+        return True
+
+    @staticmethod
+    def _run_tool_call(executor, tc, phase_callback=None):
+        fn_name = tc["name"]
+        fn_args = tc["arguments"]
+        if phase_callback:
+            phase_callback(f"Running {fn_name}")
+        print(f"  [Tool: {fn_name}] {json.dumps(fn_args, ensure_ascii=False)[:120]}")
+        try:
+            return executor(fn_name, fn_args)
+        except AgentCancelled:
+            raise
+        except Exception as exc:
+            return json.dumps(
+                {"ok": False, "tool": fn_name, "error": str(exc)},
+                ensure_ascii=False,
+            )
+
+    def _run_tool_batch(self, executor, batch_executor, calls, phase_callback=None):
+        """Run one turn's tool calls; results come back in call order.
+
+        batch_executor(list of (name, arguments)) returns one future per
+        call, so a front-end can run the whole turn in a single hop.
+        """
+        if batch_executor is None or len(calls) < 2:
+            return [self._run_tool_call(executor, tc, phase_callback) for tc in calls]
+        if phase_callback:
+            phase_callback("Running " + ", ".join(tc["name"] for tc in calls))
+        for tc in calls:
+            print(
+                f"  [Tool: {tc['name']}] "
+                f"{json.dumps(tc['arguments'], ensure_ascii=False)[:120]}"
+            )
+        futures = batch_executor([(tc["name"], tc["arguments"]) for tc in calls])
+        results = []
+        for tc, future in zip(calls, futures):
+            try:
+                results.append(future.result())
+            except CancelledError:
+                raise AgentCancelled("Cancelled by user.")
+            except AgentCancelled:
+                raise
+            except Exception as exc:
+                results.append(
+                    json.dumps(
+                        {"ok": False, "tool": tc["name"], "error": str(exc)},
+                        ensure_ascii=False,
+                    )
+                )
+        return results
+
+    def _try_fast_path(self, message, executor, phase_callback=None):
+        """Run a prompt that match_intent resolves, without calling the LLM.
+
+        The exchange is recorded as a run_pymol_commands call so later turns
+        know what was done. Returns the response, or None for the agent loop.
+        """
+        start = time.perf_counter()
+        stats = self.fast_path_stats
+        stats["prompts"] += 1
+        intent = match_intent(message)
+        if intent is None:
+            return None
+        stats["matched"] += 1
+
+        call_id = f"fast_path_{stats['matched']}"
+        arguments = {"commands": intent["commands"]}
+        raw_call = {
+            "id": call_id,
+            "type": "function",
+            "function": {
+                "name": "run_pymol_commands",
+                "arguments": json.dumps(arguments, ensure_ascii=False),
+            },
+        }
+        result = self._run_tool_call(
+            executor,
+            {"id": call_id, "name": "run_pymol_commands", "arguments": arguments},
+            phase_callback,
+        )
+        try:
+            data = json.loads(result)
+        except (json.JSONDecodeError, TypeError):
+            data = {"ok": False, "error": str(result)}
+
+        recipes = ", ".join(intent["recipes"])
+        if data.get("ok"):
+            response = (
+                f"Done ({recipes}): ran {data.get('executed_count', 0)} PyMOL commands."
+            )
+        else:
+            errors = data.get("errors") or [{"error": data.get("error", "unknown error")}]
+            response = (
+                f"Ran the {recipes} recipe with {len(errors)} error(s): "
+                f"{errors[0].get('error', '')}"
+            )
+        self.conversation_history.extend(
+            [
+                {"role": "user", "content": message},
+                {"role": "assistant", "content": "", "tool_calls": [raw_call]},
+                {
+                    "role": "tool",
+                    "tool_call_id": call_id,
+                    "content": self._compact_tool_result("run_pymol_commands", result),
+                },
+                {"role": "assistant", "content": response},
+            ]
+        )
+        self._summarize_old_turns()
+
+        elapsed = time.perf_counter() - start
+        saved = ""
+        if self._agent_turn_s is not None:
+            stats["saved_s"] += max(0.0, self._agent_turn_s - elapsed)
+            saved = f", ~{max(0.0, self._agent_turn_s - elapsed):.1f}s saved"
+        print(
+            f"  [FastPath] {recipes} in {elapsed * 1000:.0f} ms{saved} "
+            f"({stats['matched']}/{stats['prompts']} prompts matched)"
+        )
+        return response
+
     def _run_agent_loop_internal(
-        self, message, tool_executor=None, phase_callback=None
+        self,
+        message,
+        tool_executor=None,
+        phase_callback=None,
+        text_callback=None,
+        batch_executor=None,
     ):
+        executor = self._make_tool_executor(tool_executor)
+        if self.config.get("fast_path", True):
+            response = self._try_fast_path(message, executor, phase_callback)
+            if response is not None:
+                return response
+        turn_start = time.perf_counter()
         self.conversation_history.append({"role": "user", "content": message})
 
         model = self.config["text_model"]
@@ -910,15 +2451,52 @@ class ChatMolAgent:
         max_tokens = self.config.get("max_tokens", 4096)
         max_iterations = max(1, int(self.config.get("max_iterations", 50) or 50))
         max_tool_calls = max(8, int(self.config.get("max_tool_calls", 30) or 30))
-        executor = self._make_tool_executor(tool_executor)
         tool_calls_used = 0
+        turn_usage = {"prompt_tokens": 0, "cached_tokens": 0}
 
         for iteration in range(max_iterations):
             if phase_callback:
                 phase_callback("Thinking" if iteration == 0 else "Thinking more")
 
-            messages = [{"role": "system", "content": SYSTEM_PROMPT}]
-            messages += self.conversation_history
+            messages = self._build_messages(model)
+
+            # With streaming, each tool call starts as soon as its arguments
+            # are complete, while the rest of the response is still arriving.
+            # A batch_executor instead gets the whole turn in one batch once
+            # the stream ends, so the front-end runs it in a single hop.
+            early_results = {}
+            early_keys = {}
+            # Results of calls from a failed stream, by (name, arguments): a
+            # retried stream that sends the same call reuses them instead of
+            # changing the scene twice.
+            already_ran = {}
+
+            def _call_key(tc):
+                return tc["name"], json.dumps(tc["arguments"], sort_keys=True)
+
+            def _on_tool_call(raw_call):
+                try:
+                    tc = self._parse_tool_calls({"tool_calls": [raw_call]})[0]
+                except RuntimeError:
+                    return  # reported when the full message is parsed
+                key = _call_key(tc)
+                if already_ran.get(key):
+                    early_results[tc["id"]] = already_ran[key].pop(0)
+                    early_keys[tc["id"]] = key
+                    return
+                ran_before = sum(len(v) for v in already_ran.values())
+                if tool_calls_used + ran_before + len(early_results) >= max_tool_calls:
+                    return
+                early_results[tc["id"]] = self._run_tool_call(
+                    executor, tc, phase_callback
+                )
+                early_keys[tc["id"]] = key
+
+            def _on_retry():
+                for tc_id, result in early_results.items():
+                    already_ran.setdefault(early_keys[tc_id], []).append(result)
+                early_results.clear()
+                early_keys.clear()
 
             data = self._chat_completion_with_retry(
                 model,
@@ -927,7 +2505,15 @@ class ChatMolAgent:
                 temperature,
                 max_tokens,
                 phase_callback,
+                text_callback=text_callback,
+                tool_call_callback=_on_tool_call if batch_executor is None else None,
+                retry_callback=_on_retry,
             )
+            # Calls that ran before a retry but were not sent again still ran
+            tool_calls_used += sum(len(v) for v in already_ran.values())
+            counts = self._record_usage(data)
+            for key in turn_usage:
+                turn_usage[key] += counts[key]
             assistant_msg = self._parse_assistant_message(data)
             parsed_calls = self._parse_tool_calls(assistant_msg)
             content = self._normalize_content(assistant_msg.get("content", None))
@@ -937,23 +2523,16 @@ class ChatMolAgent:
                 history_entry["tool_calls"] = [tc["raw"] for tc in parsed_calls]
 
             if parsed_calls:
-                tool_entries = []
+                results = dict(early_results)
+                pending = []
                 for tc in parsed_calls:
-                    fn_name = tc["name"]
-                    fn_args = tc["arguments"]
-
-                    if phase_callback:
-                        phase_callback(f"Running {fn_name}")
-                    print(
-                        f"  [Tool: {fn_name}] "
-                        f"{json.dumps(fn_args, ensure_ascii=False)[:120]}"
-                    )
-
-                    if tool_calls_used >= max_tool_calls:
-                        result = json.dumps(
+                    if tc["id"] in results:
+                        pass
+                    elif tool_calls_used + len(pending) >= max_tool_calls:
+                        results[tc["id"]] = json.dumps(
                             {
                                 "ok": False,
-                                "tool": fn_name,
+                                "tool": tc["name"],
                                 "error": (
                                     "Tool-call budget reached. Stop calling tools "
                                     "and provide your final response."
@@ -962,29 +2541,47 @@ class ChatMolAgent:
                             ensure_ascii=False,
                         )
                     else:
-                        try:
-                            result = executor(fn_name, fn_args)
-                        except Exception as exc:
-                            result = json.dumps(
-                                {"ok": False, "tool": fn_name, "error": str(exc)},
-                                ensure_ascii=False,
-                            )
-
-                    tool_entries.append(
-                        {
-                            "role": "tool",
-                            "tool_call_id": tc["id"],
-                            "content": result,
-                        }
-                    )
-                    tool_calls_used += 1
+                        pending.append(tc)
+                    if tc["id"] in early_results:
+                        tool_calls_used += 1
+                batch_results = self._run_tool_batch(
+                    executor, batch_executor, pending, phase_callback
+                )
+                for tc, result in zip(pending, batch_results):
+                    results[tc["id"]] = result
+                tool_calls_used += len(pending)
+
+                tool_entries = [
+                    {
+                        "role": "tool",
+                        "tool_call_id": tc["id"],
+                        "content": self._compact_tool_result(
+                            tc["name"], results[tc["id"]]
+                        ),
+                    }
+                    for tc in parsed_calls
+                ]
 
                 self.conversation_history.append(history_entry)
                 self.conversation_history.extend(tool_entries)
+                self._summarize_old_turns()
                 continue
 
             # No tool calls — this is the final response
             self.conversation_history.append(history_entry)
+            if turn_usage["prompt_tokens"]:
+                share = 100.0 * turn_usage["cached_tokens"] / turn_usage["prompt_tokens"]
+                print(
+                    f"  [Usage] {iteration + 1} requests, "
+                    f"{turn_usage['prompt_tokens']} prompt tokens, "
+                    f"{turn_usage['cached_tokens']} cached ({share:.0f}%)"
+                )
+            turn_s = time.perf_counter() - turn_start
+            self._agent_turn_s = (
+                turn_s
+                if self._agent_turn_s is None
+                else 0.7 * self._agent_turn_s + 0.3 * turn_s
+            )
             return (content or "").strip()
 
         return (
@@ -995,9 +2592,20 @@ class ChatMolAgent:
     def _run_agent_loop(self, message):
         return self._run_agent_loop_internal(message, tool_executor=None)
 
-    def run_agent_loop_with_callback(self, message, tool_executor, phase_callback=None):
+    def run_agent_loop_with_callback(
+        self,
+        message,
+        tool_executor,
+        phase_callback=None,
+        text_callback=None,
+        batch_executor=None,
+    ):
         return self._run_agent_loop_internal(
-            message, tool_executor=tool_executor, phase_callback=phase_callback
+            message,
+            tool_executor=tool_executor,
+            phase_callback=phase_callback,
+            text_callback=text_callback,
+            batch_executor=batch_executor,
         )
 
 
@@ -1034,6 +2642,8 @@ try:
 
     QColor = QtGui.QColor
     QPainter = QtGui.QPainter
+    QTextCursor = QtGui.QTextCursor
+    QTextCharFormat = QtGui.QTextCharFormat
 
     _HAS_QT = True
 except ImportError:
@@ -1126,46 +2736,96 @@ if _HAS_QT:
     # -- AgentWorker --------------------------------------------------------
 
     class AgentWorker(QThread):
-        """Runs the agentic loop off the main thread."""
+        """Runs the agentic loop off the main thread.
+
+        PyMOL tools must run on the main thread: each turn's tool calls are
+        sent there as one batch of futures (request_tool_batch) and run in
+        a single event-loop slice. There is no timeout; cancel() stops the
+        loop and cancels tools that have not started.
+        """
 
         finished = Signal(str)
         error = Signal(str)
+        cancelled = Signal()
         tool_executed = Signal(str, str)
-        request_tool_execution = Signal(str, str, str)
+        request_tool_batch = Signal(object)
         phase_changed = Signal(str)
+        text_delta = Signal(str)
 
         def __init__(self, agent, message, parent=None):
             super().__init__(parent)
             self.agent = agent
             self.message = message
-            self._tool_result = None
-            self._tool_event = threading.Event()
+            self._cancel_event = threading.Event()
+            self._pending = []
+            self._pending_lock = threading.Lock()
 
         def run(self):
             try:
                 response = self.agent.run_agent_loop_with_callback(
-                    self.message, self._tool_executor, phase_callback=self._on_phase
+                    self.message,
+                    self._tool_executor,
+                    phase_callback=self._on_phase,
+                    text_callback=self._on_text,
+                    batch_executor=self.submit_tools,
                 )
                 self.finished.emit(response)
+            except AgentCancelled:
+                self.cancelled.emit()
             except Exception as exc:
                 self.error.emit(str(exc))
 
+        def cancel(self):
+            self._cancel_event.set()
+            with self._pending_lock:
+                pending, self._pending = self._pending, []
+            for item in pending:
+                item["future"].cancel()
+
+        def _check_cancelled(self):
+            if self._cancel_event.is_set():
+                raise AgentCancelled("Cancelled by user.")
+
         def _on_phase(self, phase_text):
+            self._check_cancelled()
             self.phase_changed.emit(phase_text)
 
-        def _tool_executor(self, tool_name, arguments):
-            self._tool_event.clear()
-            self._tool_result = None
-            args_json = json.dumps(arguments, ensure_ascii=False)
-            self.request_tool_execution.emit("", tool_name, args_json)
-            self._tool_event.wait(timeout=60)
-            result = self._tool_result or "Tool execution timed out."
-            self.tool_executed.emit(tool_name, result[:200])
-            return result
+        def _on_text(self, text):
+            self._check_cancelled()
+            self.text_delta.emit(text)
+
+        def submit_tools(self, calls):
+            """Queue [(tool_name, arguments), ...] for the main thread."""
+            self._check_cancelled()
+            batch = [
+                {"name": name, "arguments": arguments, "future": Future(), "elapsed": 0.0}
+                for name, arguments in calls
+            ]
+            with self._pending_lock:
+                self._pending.extend(batch)
+            for item in batch:
+                item["future"].add_done_callback(self._on_tool_done(item))
+            self.request_tool_batch.emit(batch)
+            return [item["future"] for item in batch]
+
+        def _on_tool_done(self, item):
+            def _done(future):
+                with self._pending_lock:
+                    if item in self._pending:
+                        self._pending.remove(item)
+                if not future.cancelled() and future.exception() is None:
+                    self.tool_executed.emit(
+                        item["name"], f"{item['elapsed']:.2f}s {future.result()[:200]}"
+                    )
 
-        def deliver_tool_result(self, result):
-            self._tool_result = result
-            self._tool_event.set()
+            return _done
+
+        def _tool_executor(self, tool_name, arguments):
+            future = self.submit_tools([(tool_name, arguments)])[0]
+            try:
+                return future.result()
+            except CancelledError:
+                raise AgentCancelled("Cancelled by user.")
 
     # -- ChatMolSettingsDialog ----------------------------------------------
 
@@ -1344,6 +3004,7 @@ if _HAS_QT:
             super().__init__("ChatMol", parent)
             self.agent = agent
             self._worker = None
+            self._streaming = False
             self._build_ui()
 
         def _build_ui(self):
@@ -1396,6 +3057,11 @@ if _HAS_QT:
             self.send_btn.setFixedWidth(50)
             self.send_btn.clicked.connect(self._on_send)
             input_bar.addWidget(self.send_btn)
+            self.stop_btn = QPushButton("Stop")
+            self.stop_btn.setFixedWidth(50)
+            self.stop_btn.clicked.connect(self._on_stop)
+            self.stop_btn.hide()
+            input_bar.addWidget(self.stop_btn)
             self.model_label = QLabel()
             self.model_label.setStyleSheet("color: grey; font-size: 10px;")
             self._update_model_label()
@@ -1454,17 +3120,33 @@ if _HAS_QT:
 
             self.thinking.start("Thinking")
 
+            self.send_btn.hide()
+            self.stop_btn.setEnabled(True)
+            self.stop_btn.show()
+
             self._worker = AgentWorker(self.agent, text)
-            self._worker.request_tool_execution.connect(
-                self._execute_tool_on_main_thread
-            )
+            self._worker.request_tool_batch.connect(self._execute_tools_on_main_thread)
+            self._worker.cancelled.connect(self._on_agent_cancelled)
             self._worker.phase_changed.connect(self._on_phase_changed)
+            self._worker.text_delta.connect(self._on_text_delta)
             self._worker.tool_executed.connect(self._on_tool_executed)
             self._worker.finished.connect(self._on_agent_finished)
             self._worker.error.connect(self._on_agent_error)
             self._worker.start()
 
+        def _on_text_delta(self, text):
+            if not self._streaming:
+                self._streaming = True
+                self._append_html("<b>ChatMol:</b> ")
+            cursor = self.chat_display.textCursor()
+            cursor.movePosition(QTextCursor.End)
+            cursor.insertText(text, QTextCharFormat())
+            sb = self.chat_display.verticalScrollBar()
+            sb.setValue(sb.maximum())
+
         def _on_phase_changed(self, phase_text):
+            # Streamed text before a tool call or retry is its own message
+            self._streaming = False
             self.thinking.set_phase(phase_text)
             if "Retry" in phase_text:
                 self._append_trace(f"[phase] {phase_text}")
@@ -1472,33 +3154,53 @@ if _HAS_QT:
         def _on_tool_executed(self, tool_name, result_preview):
             self._append_trace(f"[tool:{tool_name}] {result_preview}")
 
-        def _execute_tool_on_main_thread(self, _call_id, tool_name, args_json):
-            try:
-                arguments = json.loads(args_json)
-            except (json.JSONDecodeError, TypeError):
-                arguments = {}
-            self._append_trace(f"[call:{tool_name}] {args_json[:180]}")
-            try:
-                result = execute_tool(
-                    tool_name,
-                    arguments,
-                    client=self.agent.client,
-                    vision_model=self.agent.config.get("vision_model", ""),
-                )
-            except Exception as exc:
-                result = f"Tool error: {exc}"
+        def _execute_tools_on_main_thread(self, batch):
+            for item in batch:
+                future = item["future"]
+                if not future.set_running_or_notify_cancel():
+                    continue  # cancelled before it started
+                args_json = json.dumps(item["arguments"], ensure_ascii=False)
+                self._append_trace(f"[call:{item['name']}] {args_json[:180]}")
+                start = time.perf_counter()
+                try:
+                    result = execute_tool(
+                        item["name"],
+                        item["arguments"],
+                        client=self.agent.client,
+                        vision_model=self.agent.config.get("vision_model", ""),
+                        vision_options=self.agent.vision_options(),
+                    )
+                except Exception as exc:
+                    result = f"Tool error: {exc}"
+                item["elapsed"] = time.perf_counter() - start
+                future.set_result(result)
+
+        def _on_stop(self):
             if self._worker is not None:
-                self._worker.deliver_tool_result(result)
+                self.stop_btn.setEnabled(False)
+                self.thinking.set_phase("Stopping")
+                self._worker.cancel()
 
-        def _on_agent_finished(self, response):
+        def _finish_run(self):
             self.thinking.stop()
-            self._append_html(f"<b>ChatMol:</b> {_escape_html(response)}")
+            self._streaming = False
+            self.stop_btn.hide()
+            self.send_btn.show()
             self.input_edit.setEnabled(True)
             self.send_btn.setEnabled(True)
             self.input_edit.setFocus()
 
+        def _on_agent_cancelled(self):
+            self._append_trace("[cancelled]")
+            self._append_html('<span style="color:grey;">Stopped.</span>')
+            self._finish_run()
+
+        def _on_agent_finished(self, response):
+            if not self._streaming:
+                self._append_html(f"<b>ChatMol:</b> {_escape_html(response)}")
+            self._finish_run()
+
         def _on_agent_error(self, error_msg):
-            self.thinking.stop()
             prov = self.agent.config.get("provider", "?")
             model = self.agent.config.get("text_model", "?")
             self._append_trace(f"[error] {error_msg}")
@@ -1507,9 +3209,7 @@ if _HAS_QT:
                 f"[{_escape_html(prov)}/{_escape_html(model)}]: "
                 f"{_escape_html(error_msg)}</span>"
             )
-            self.input_edit.setEnabled(True)
-            self.send_btn.setEnabled(True)
-            self.input_edit.setFocus()
+            self._finish_run()
 
 
 def _escape_html(text):
@@ -1525,17 +3225,44 @@ def _escape_html(text):
 # 6. Module-level initialisation
 # ---------------------------------------------------------------------------
 
-_agent = ChatMolAgent()
+# The agent (config file, client prewarm) is created on first use, so the
+# tool and render helpers above can be imported without side effects. It
+# applies its render settings to the module's render queue.
+_agent = None
+
+
+def _get_agent():
+    """Return the plugin's agent, creating it on first use."""
+    global _agent
+    if _agent is None:
+        _agent = ChatMolAgent()
+        _render_queue.configure(
+            max_concurrent=max(1, int(_agent.config.get("max_concurrent_renders", 1) or 1)),
+            tiles=max(0, int(_agent.config.get("render_tiles", 0) or 0)),
+        )
+    return _agent
+
+
+def _agent_command(name):
+    """PyMOL command that calls the agent method *name*, creating the agent first."""
+
+    def command(*args, _self=None, **kwargs):
+        return getattr(_get_agent(), name)(*args, **kwargs)
+
+    command.__name__ = name
+    command.__doc__ = getattr(ChatMolAgent, name).__doc__
+    return command
 
-cmd.extend("chat", _agent.chat)
-cmd.extend("set_provider", _agent.set_provider)
-cmd.extend("set_api_key", _agent.set_api_key)
-cmd.extend("set_model", _agent.set_model)
-cmd.extend("set_vision_model", _agent.set_vision_model)
-cmd.extend("reset_conversation", _agent.reset_conversation)
-cmd.extend("save_conversation", _agent.save_conversation)
-cmd.extend("load_conversation", _agent.load_conversation)
-cmd.extend("chatmol_config", _agent.show_config)
+
+cmd.extend("chat", _agent_command("chat"))
+cmd.extend("set_provider", _agent_command("set_provider"))
+cmd.extend("set_api_key", _agent_command("set_api_key"))
+cmd.extend("set_model", _agent_command("set_model"))
+cmd.extend("set_vision_model", _agent_command("set_vision_model"))
+cmd.extend("reset_conversation", _agent_command("reset_conversation"))
+cmd.extend("save_conversation", _agent_command("save_conversation"))
+cmd.extend("load_conversation", _agent_command("load_conversation"))
+cmd.extend("chatmol_config", _agent_command("show_config"))
 
 
 def chatmol_settings():
@@ -1550,7 +3277,7 @@ def chatmol_settings():
     if app is None:
         print("No Qt application running.")
         return
-    dlg = ChatMolSettingsDialog(_agent)
+    dlg = ChatMolSettingsDialog(_get_agent())
     dlg.exec_()
 
 
@@ -1559,8 +3286,27 @@ def chatmol_gui():
     _init_gui()
 
 
+def tiled_render(path, width=2400, height=1800, dpi=300, tiles=0):
+    """Ray trace the scene to a PNG in parallel bands and wait for it.
+
+    tiled_render path [, width [, height [, dpi [, tiles ]]]]
+    tiles=0 uses the render_tiles setting. Perspective views render in a
+    single process.
+    """
+    _get_agent()  # applies the render settings from the config
+    out_path = os.path.abspath(os.path.expanduser(path))
+    width, height, dpi = int(width), int(height), int(dpi)
+    job = _render_queue.submit(
+        out_path, width, height, dpi, 1, None, tiles=int(tiles) or None
+    )
+    job["done"].wait()
+    if job["error"]:
+        print(f"tiled_render failed: {job['error']}")
+
+
 cmd.extend("chatmol_settings", chatmol_settings)
 cmd.extend("chatmol_gui", chatmol_gui)
+cmd.extend("tiled_render", tiled_render)
 
 
 _chatbar = None
@@ -1594,7 +3340,7 @@ def _init_gui():
         print("ChatMol: could not find PyMOL main window for docking.")
         return
 
-    _chatbar = ChatMolChatBar(_agent, main_win)
+    _chatbar = ChatMolChatBar(_get_agent(), main_win)
     main_win.addDockWidget(Qt.BottomDockWidgetArea, _chatbar)
     print("ChatMol chat bar loaded.")
 
@@ -1608,5 +3354,5 @@ if _HAS_QT:
 print(
     "ChatMol plugin loaded. Commands: chat, set_provider, set_api_key, "
     "set_model, set_vision_model, reset_conversation, "
-    "chatmol_config, chatmol_settings, chatmol_gui"
+    "chatmol_config, chatmol_settings, chatmol_gui, tiled_render"
 )
@@ -0,0 +1,117 @@
+"""A streamed turn's tool calls reach the front-end's batch executor together."""
+import importlib.util
+import json
+import os
+from concurrent.futures import Future
+
+import pytest
+
+pytest.importorskip("pymol")
+pytest.importorskip("requests")
+
+PLUGIN_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "chatmol.py"
+)
+
+
+@pytest.fixture(scope="module")
+def plugin():
+    spec = importlib.util.spec_from_file_location("chatmol_plugin", PLUGIN_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class FakeStream:
+    """requests.Response stand-in that replays server-sent events."""
+
+    status_code = 200
+    headers = {"Content-Type": "text/event-stream"}
+
+    def __init__(self, events):
+        self.lines = ["data: " + json.dumps(event) for event in events]
+        self.lines.append("data: [DONE]")
+
+    def iter_lines(self, decode_unicode=False):
+        return iter(self.lines)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class FakeSession:
+    def __init__(self, responses):
+        self.responses = list(responses)
+
+    def post(self, *args, **kwargs):
+        return FakeStream(self.responses.pop(0))
+
+
+def _tool_call_events(calls):
+    events = []
+    for index, (name, arguments) in enumerate(calls):
+        text = json.dumps(arguments)
+        # Arguments arrive in two fragments, as providers send them
+        events.append({"choices": [{"delta": {"tool_calls": [{
+            "index": index,
+            "id": f"call_{index}",
+            "function": {"name": name, "arguments": text[:5]},
+        }]}}]})
+        events.append({"choices": [{"delta": {"tool_calls": [{
+            "index": index,
+            "function": {"arguments": text[5:]},
+        }]}}]})
+    events.append({"choices": [{"delta": {}, "finish_reason": "tool_calls"}]})
+    return events
+
+
+def test_streamed_tool_calls_arrive_as_one_batch(plugin, tmp_path, monkeypatch):
+    config_path = tmp_path / "chatmol_config.json"
+    config_path.write_text(json.dumps({
+        "api_keys": {"openrouter": "test-key"},
+        "stream": True,
+        "fast_path": False,
+    }))
+    monkeypatch.setattr(plugin.ChatMolAgent, "CONFIG_PATH", str(config_path))
+    monkeypatch.setattr(plugin, "prewarm_connection", lambda base_url: None)
+    agent = plugin.ChatMolAgent()
+
+    calls = [
+        ("run_pymol_commands", {"commands": ["fetch 1pga"]}),
+        ("run_pymol_commands", {"commands": ["show cartoon"]}),
+        ("inspect_session", {}),
+    ]
+    final = [
+        {"choices": [{"delta": {"content": "Done."}}]},
+        {"choices": [{"delta": {}, "finish_reason": "stop"}]},
+    ]
+    agent.client.session = FakeSession([_tool_call_events(calls), final])
+
+    single_calls = []
+    batches = []
+
+    def tool_executor(name, arguments):
+        single_calls.append((name, arguments))
+        return json.dumps({"ok": True})
+
+    def batch_executor(batch):
+        batches.append(batch)
+        futures = []
+        for _ in batch:
+            future = Future()
+            future.set_result(json.dumps({"ok": True}))
+            futures.append(future)
+        return futures
+
+    response = agent.run_agent_loop_with_callback(
+        "load 1pga as a cartoon",
+        tool_executor,
+        batch_executor=batch_executor,
+    )
+
+    assert response == "Done."
+    assert single_calls == []
+    assert batches == [calls]